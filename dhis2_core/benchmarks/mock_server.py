@@ -0,0 +1,523 @@
+#!/usr/bin/env python
+"""
+Stand-in for the DHIS2, ICD API and FHIR servers, serves deterministic synthetic data so the
+benchmarks (and manual testing) can run offline.
+
+    python benchmarks/mock_server.py --port 8080 --size 1000 --latency 0.02
+"""
+
+import argparse
+import gzip
+import json
+import random
+import socket
+import sys
+import threading
+import time
+import traceback
+import zlib
+from collections import Counter
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from pydantic import BaseModel, Field
+
+SRC_DIR = Path(__file__).resolve().parent.parent / "src"
+sys.path.insert(0, str(SRC_DIR))  # use this checkout, not an installed version
+
+ICD11_BASE = "http://id.who.int/icd/release/11"
+ICD10_BASE = "http://id.who.int/icd/release/10"
+
+
+class MockConfig(BaseModel):
+    latency: float = Field(0.0, ge=0)  # seconds added to every response
+    orgUnits: int = Field(1000, ge=0)
+    optionSets: int = Field(100, ge=0)
+    categories: int = Field(50, ge=0)
+    optionsPerSet: int = Field(10, ge=0)
+    trackedEntities: int = Field(100, ge=0)
+    schemas: int = Field(100, ge=0)
+    propertiesPerSchema: int = Field(30, ge=0)
+    icdDepth: int = Field(4, ge=0)  # levels below the root
+    icdBranching: int = Field(4, ge=1, le=9)  # children per entity
+    compress: bool = True  # gzip responses if the client accepts it
+
+    @classmethod
+    def from_size(cls, size: int, **kwargs) -> "MockConfig":
+        """ Scales all collections with the number of organisation units """
+        return cls(
+            orgUnits=size,
+            optionSets=max(size // 10, 1),
+            categories=max(size // 20, 1),
+            trackedEntities=max(size // 10, 1),
+            **kwargs,
+        )
+
+    def icd_count(self) -> int:
+        return sum(self.icdBranching ** depth for depth in range(self.icdDepth + 1))
+
+
+def uid(prefix: str, idx: int) -> str:
+    return f"{prefix}{idx:0{11 - len(prefix)}d}"
+
+
+def _translations(name: str) -> List[Dict[str, str]]:
+    return [{"property": "NAME", "locale": "fr", "value": f"{name} (fr)"}]
+
+
+class MockData:
+    """ Lazily generated payloads, all derived from the config so every run serves the same data """
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self._lock = threading.Lock()
+        self._cache: Dict[str, Any] = {}
+
+    def get(self, name: str) -> Any:
+        with self._lock:
+            if name not in self._cache:
+                self._cache[name] = getattr(self, f"_build_{name}")()
+
+            return self._cache[name]
+
+    def _build_org_units(self) -> List[Dict[str, Any]]:
+        r = random.Random(1)
+        org_units = []
+
+        for idx in range(self.config.orgUnits):
+            ou = {"id": uid("ou", idx), "code": f"OU_{idx}", "name": f"Facility {idx}", "level": 1}
+            ou["translations"] = _translations(ou["name"])
+
+            if idx:
+                ou["parent"] = {"id": uid("ou", (idx - 1) // 10), "code": f"OU_{(idx - 1) // 10}"}
+                ou["level"] = org_units[(idx - 1) // 10]["level"] + 1  # indexes are in level order
+
+            if idx % 10 == 0:  # districts have boundaries
+                x, y = r.uniform(-10, 10), r.uniform(-10, 10)
+                ring = [[round(x + r.uniform(-1, 1), 6), round(y + r.uniform(-1, 1), 6)] for _ in range(50)]
+                ou["geometry"] = {"type": "Polygon", "coordinates": [ring + ring[:1]]}
+            else:
+                point = [round(r.uniform(-10, 10), 6), round(r.uniform(-10, 10), 6)]
+                ou["geometry"] = {"type": "Point", "coordinates": point}
+
+            org_units.append(ou)
+
+        return org_units
+
+    def _code_lists(self, prefix: str, count: int, options_key: str) -> List[Dict[str, Any]]:
+        code_lists = []
+
+        for idx in range(count):
+            name = f"{prefix} {idx}"
+            options = [
+                {
+                    "id": uid(f"{prefix[:2].lower()}o", idx * self.config.optionsPerSet + jdx),
+                    "code": f"{prefix.upper()}_{idx}_{jdx}",
+                    "name": f"{name} option {jdx}",
+                    "translations": _translations(f"{name} option {jdx}"),
+                }
+                for jdx in range(self.config.optionsPerSet)
+            ]
+
+            code_lists.append(
+                {
+                    "id": uid(prefix[:2].lower(), idx),
+                    "code": f"{prefix.upper()}_{idx}",
+                    "name": name,
+                    "version": 1,
+                    "translations": _translations(name),
+                    options_key: options,
+                }
+            )
+
+        return code_lists
+
+    def _build_option_sets(self) -> List[Dict[str, Any]]:
+        return self._code_lists("OptionSet", self.config.optionSets, "options")
+
+    def _build_categories(self) -> List[Dict[str, Any]]:
+        return self._code_lists("Category", self.config.categories, "options")  # as renamed by the query
+
+    def _build_schemas(self) -> List[Dict[str, Any]]:
+        r = random.Random(2)
+        types = ["BOOLEAN", "INTEGER", "NUMBER", "EMAIL", "URL", "DATE", "TEXT", "IDENTIFIER", "CONSTANT", "REFERENCE"]
+        types += ["COLLECTION", "COMPLEX"]
+        schemas = []
+
+        for idx in range(self.config.schemas):
+            properties = []
+
+            for jdx in range(self.config.propertiesPerSchema):
+                type = r.choice(types)
+                properties.append(
+                    {
+                        "name": f"property{jdx}",
+                        "fieldName": f"property{jdx}",
+                        "collectionName": f"properties{jdx}",
+                        "klass": f"org.hisp.dhis.Property{jdx}",
+                        "propertyType": type,
+                        "itemPropertyType": "REFERENCE" if "COLLECTION" == type else None,
+                        "constants": ["A", "B", "C"] if "CONSTANT" == type else [],
+                        "required": r.random() < 0.2,
+                        "collection": "COLLECTION" == type,
+                        "identifiableObject": r.random() < 0.5,
+                        "simple": True,
+                        "writable": True,
+                        "readable": True,
+                        "persisted": True,
+                        "owner": True,
+                        "unique": False,
+                        "ordered": False,
+                        "oneToOne": False,
+                        "manyToOne": False,
+                        "manyToMany": False,
+                        "nameableObject": False,
+                        "embeddedObject": False,
+                        "analyticalObject": False,
+                        "attribute": False,
+                        "propertyTransformer": False,
+                    }
+                )
+
+            schemas.append(
+                {
+                    "klass": f"org.hisp.dhis.Object{idx}",
+                    "name": f"object{idx}",
+                    "singular": f"object{idx}",
+                    "plural": f"objects{idx}",
+                    "displayName": f"Object {idx}",
+                    "href": f"/api/schemas/object{idx}",
+                    "metadata": idx % 3 != 0,
+                    "embeddedObject": idx % 6 == 0,
+                    "identifiableObject": True,
+                    "nameableObject": False,
+                    "shareable": True,
+                    "dataShareable": False,
+                    "translatable": False,
+                    "favoritable": False,
+                    "subscribable": False,
+                    "subscribableObject": False,
+                    "secondaryMetadata": False,
+                    "implicitPrivateAuthority": False,
+                    "persisted": True,
+                    "order": idx,
+                    "defaultPrivate": "rw------",
+                    "references": [],
+                    "authorities": [],
+                    "properties": properties,
+                }
+            )
+
+        return schemas
+
+    def _build_tracked_entities(self) -> List[Dict[str, Any]]:
+        from dhis2.e2b.models.e2b import AEFIMapping  # same ids as the default mapping
+
+        mapping = AEFIMapping()
+        r = random.Random(3)
+        tracked_entities = []
+
+        def value(field: str, idx: int) -> str:
+            if field in ["serious", "death", "lifeThreatening", "hospitalization", "disabling", "otherSerious"]:
+                return r.choice(["true", "false"])
+            elif "date" in field.lower() or "expiry" in field.lower():  # birthDate, dateOfDeath, ...
+                return f"2021-0{r.randint(1, 9)}-1{r.randint(0, 9)}"
+            elif "time" in field.lower():
+                return f"1{r.randint(0, 9)}:{r.choice(['00', '15', '30', '45'])}"
+            elif "sex" == field:
+                return r.choice(["MALE", "FEMALE"])
+            elif "outcome" == field:
+                return r.choice(["Recovered/resolved", "Recovering/resolving", "Died", "Unknown"])
+            elif "dose" == field:
+                return str(r.randint(1, 3))
+
+            return f"{field} {idx}"
+
+        for idx in range(self.config.trackedEntities):
+            attributes = []
+
+            for field, ids in mapping.attributes.dict().items():
+                ids = ids if isinstance(ids, list) else [ids]
+                attributes.append({"attribute": ids[0], "value": value(field, idx)})
+
+            data_values = [
+                {"dataElement": id, "value": value(field, idx)} for field, id in mapping.dataElements.dict().items()
+            ]
+
+            for vaccine in mapping.vaccines[: r.randint(1, len(mapping.vaccines))]:
+                data_values.extend(
+                    {"dataElement": id, "value": value(field, idx)} for field, id in vaccine.dict().items()
+                )
+
+            for reaction in r.sample(mapping.reactions, 3):
+                data_values.append({"dataElement": reaction.dataElement, "value": "true"})
+
+                if reaction.typeDataElement:
+                    data_values.append({"dataElement": reaction.typeDataElement, "value": "severe"})
+
+            te = uid("te", idx)
+
+            tracked_entities.append(
+                {
+                    "trackedEntityInstance": te,
+                    "orgUnit": uid("ou", idx % max(self.config.orgUnits, 1)),
+                    "attributes": attributes[:2],
+                    "enrollments": [
+                        {
+                            "enrollment": uid("en", idx),
+                            "orgUnit": uid("ou", idx % max(self.config.orgUnits, 1)),
+                            "attributes": attributes[2:],
+                            "events": [
+                                {
+                                    "event": uid("ev", idx),
+                                    "programStage": mapping.programStage,
+                                    "eventDate": "2021-03-01T00:00:00.000",
+                                    "dataValues": data_values,
+                                }
+                            ],
+                        }
+                    ],
+                }
+            )
+
+        return tracked_entities
+
+    def icd_entity(self, base: str, release: str, id: str, icd10: bool = False) -> Optional[Dict[str, Any]]:
+        """ ICD entities are numbered by their path from the root, e.g. "1" => "12" => "123" """
+        if not id.isdigit() or not id.startswith("1") or "0" in id or len(id) > self.config.icdDepth + 1:
+            return None
+
+        depth = len(id) - 1
+        children = []
+
+        if depth < self.config.icdDepth:
+            children = [f"{id}{idx}" for idx in range(1, self.config.icdBranching + 1)]
+
+        kinds = ["chapter", "block"] + ["category"] * self.config.icdDepth
+
+        entity = {
+            "@context": f"{base}/context",
+            "@id": f"{base}/{release}/{id}",
+            "title": {"@language": "en", "@value": f"ICD entity {id}"},
+            "definition": {"@language": "en", "@value": f"Definition of ICD entity {id}, " + "lorem ipsum " * 10},
+            "classKind": kinds[depth],
+            "child": [f"{base}/{release}/{child}" for child in children],
+            "parent": [f"{base}/{release}/{id[:-1]}"] if depth else [],
+            "browserUrl": f"https://icd.who.int/browse/{id}",
+        }
+
+        if depth > 1:
+            entity["code"] = f"X{id}"
+        else:
+            entity["codeRange"] = f"X{id}-X{id}9"
+
+        if icd10 and depth > 1:
+            entity["note"] = [{"@language": "en", "@value": "note"}]
+
+        return entity
+
+
+def _paged(items: List[Any], key: str, query: Dict[str, List[str]]) -> Dict[str, Any]:
+    if "false" == query.get("paging", ["true"])[0].lower():
+        return {key: items}
+
+    page = int(query.get("page", ["1"])[0])
+    page_size = int(query.get("pageSize", ["50"])[0])
+    page_count = max((len(items) + page_size - 1) // page_size, 1)
+    start, end = (page - 1) * page_size, page * page_size
+
+    return {
+        "pager": {"page": page, "pageSize": page_size, "pageCount": page_count, "total": len(items)},
+        key: items[start:end],
+    }
+
+
+class MockServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], config: MockConfig):
+        super().__init__(address, MockRequestHandler)
+        self.config = config
+        self.data = MockData(config)
+        self.stats_lock = threading.Lock()
+        self.stats: Counter = Counter()
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, **values: int) -> None:
+        with self.stats_lock:
+            self.stats.update(values)
+
+    def reset_stats(self) -> Dict[str, int]:
+        with self.stats_lock:
+            stats, self.stats = dict(self.stats), Counter()
+
+        return stats
+
+    def start(self) -> threading.Thread:
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+
+        return thread
+
+
+class MockRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: MockServer
+
+    def setup(self):
+        super().setup()
+        # headers and body are separate writes, without this every response waits for a delayed ack
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self._handle(self._get)
+
+    def do_POST(self):
+        self._handle(self._post)
+
+    def _handle(self, fn):
+        start = time.perf_counter()
+
+        if self.server.config.latency:
+            time.sleep(self.server.config.latency)
+
+        url = urlparse(self.path)
+
+        try:
+            status, data = fn(url.path.strip("/"), parse_qs(url.query))
+        except Exception as e:  # noqa
+            traceback.print_exc()
+            status, data = 500, {"httpStatusCode": 500, "message": repr(e)}
+
+        self._send(status, data)
+
+        self.server.count(requests=1, microseconds=int((time.perf_counter() - start) * 1e6))
+
+    def _get(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, Any]:
+        data = self.server.data
+        parts = path.split("/")
+
+        if "api/system/info" == path:
+            return 200, {"version": "2.36.0", "revision": "mock", "serverDate": "2021-01-01T00:00:00.000"}
+        elif "api/schemas" == path:
+            return 200, {"schemas": data.get("schemas")}
+        elif "api/organisationUnits" == path:
+            return 200, _paged(data.get("org_units"), "organisationUnits", query)
+        elif "api/optionSets" == path:
+            return 200, _paged(data.get("option_sets"), "optionSets", query)
+        elif "api/categories" == path:
+            return 200, _paged(data.get("categories"), "categories", query)
+        elif path.startswith("api/programs/"):
+            return 200, {"id": parts[-1]}
+        elif "api/trackedEntityInstances" == path:
+            tracked_entities = data.get("tracked_entities")
+
+            if "trackedEntityInstance" in query:
+                ids = set(query["trackedEntityInstance"][0].split(";"))
+                tracked_entities = [te for te in tracked_entities if te["trackedEntityInstance"] in ids]
+
+            return 200, _paged(tracked_entities, "trackedEntityInstances", query)
+        elif path.startswith("api/trackedEntityInstances/"):
+            for te in data.get("tracked_entities"):
+                if te["trackedEntityInstance"] == parts[-1]:
+                    return 200, te
+        elif path.startswith("icd/release/11/") and len(parts) in [5, 6]:
+            # icd/release/11/<release>/<linearization>[/<id>]
+            entity = data.icd_entity(ICD11_BASE, "/".join(parts[3:5]), parts[5] if 6 == len(parts) else "1")
+
+            if entity:
+                return 200, entity
+        elif path.startswith("icd/release/10/") and len(parts) in [4, 5]:
+            # icd/release/10/<release>[/<id>]
+            entity = data.icd_entity(ICD10_BASE, parts[3], parts[4] if 5 == len(parts) else "1", icd10=True)
+
+            if entity:
+                return 200, entity
+
+        return 404, {"httpStatusCode": 404, "message": f"Not found: {path}"}
+
+    def _post(self, path: str, query: Dict[str, List[str]]) -> Tuple[int, Any]:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.server.count(bytesIn=len(body))
+
+        encoding = self.headers.get("Content-Encoding")
+
+        if "gzip" == encoding:
+            body = gzip.decompress(body)
+        elif "deflate" == encoding:
+            body = zlib.decompress(body)
+
+        bundle = json.loads(body)
+
+        # FHIR transaction, every entry succeeds
+        return 200, {
+            "resourceType": "Bundle",
+            "type": "transaction-response",
+            "entry": [{"response": {"status": "200 OK"}} for _ in bundle.get("entry", [])],
+        }
+
+    def _send(self, status: int, data: Any):
+        body = json.dumps(data).encode("utf-8")
+        headers = {"Content-Type": "application/json"}
+
+        if self.server.config.compress and "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = _gzip(body)
+            headers["Content-Encoding"] = "gzip"
+
+        self.send_response(status)
+
+        for key, value in headers.items():
+            self.send_header(key, value)
+
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+        self.server.count(bytesOut=len(body))
+
+
+@lru_cache(maxsize=32)
+def _gzip(body: bytes) -> bytes:
+    return gzip.compress(body, compresslevel=1)  # repeated payloads (e.g. schemas) are only compressed once
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mock DHIS2/ICD/FHIR server with synthetic data")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--size", type=int, default=1000, help="Number of organisation units, other collections scale")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--icd-depth", type=int, default=4)
+    parser.add_argument("--icd-branching", type=int, default=4)
+    parser.add_argument("--no-compress", action="store_true", help="Never gzip responses")
+    args = parser.parse_args()
+
+    config = MockConfig.from_size(
+        args.size,
+        latency=args.latency,
+        icdDepth=args.icd_depth,
+        icdBranching=args.icd_branching,
+        compress=not args.no_compress,
+    )
+
+    server = MockServer((args.host, args.port), config)
+    print(f"Serving on {server.url} (dhis2: {server.url}, icd: {server.url}, fhir: {server.url}/fhir)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmarks, runs dhis2 commands in subprocesses against the mock server and records
+wall time, throughput, request latency and peak memory (RSS) for every scenario.
+
+    python benchmarks/run.py --size 5000 --repeat 3 --output results.json
+    python benchmarks/run.py --size 5000 --repeat 3 --baseline results.json  # fails on regressions
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional
+
+from mock_server import SRC_DIR, MockConfig, MockServer
+
+
+class Scenario(NamedTuple):
+    name: str
+    args: List[str]  # arguments after `dhis2 -i <inventory>`
+    items: Callable[[MockConfig], int]  # number of items processed, for throughput
+
+
+def get_scenarios(workdir: Path) -> List[Scenario]:
+    return [
+        Scenario(
+            "icd11",
+            ["code-list", "icd11", "icd11", "--root-id", "1", "--concurrency", "8", "--no-cache"],
+            lambda c: c.icd_count(),
+        ),
+        Scenario("icd10", ["code-list", "icd10", "icd10", "--root-id", "1", "--no-cache"], lambda c: c.icd_count()),
+        Scenario("svcm", ["code-list", "svcm", str(workdir / "svcm.json")], lambda c: c.optionSets + c.categories),
+        Scenario(
+            "svcm-fast",
+            ["code-list", "svcm", str(workdir / "svcm.json"), "--fast"],
+            lambda c: c.optionSets + c.categories,
+        ),
+        Scenario("mcsd", ["facility-list", "mcsd", str(workdir / "mcsd.json")], lambda c: c.orgUnits),
+        Scenario(
+            "mcsd-fast-stream",
+            ["facility-list", "mcsd", str(workdir / "mcsd-stream.json"), "--fast"],
+            lambda c: c.orgUnits,
+        ),
+        Scenario(
+            "e2b",
+            ["e2b", "dhis2", "--org-unit", "ou000000000", "--output", os.devnull],
+            lambda c: c.trackedEntities,
+        ),
+        Scenario("json_schemas", ["generate", "json_schemas", "dhis2", "--no-cache"], lambda c: c.schemas),
+    ]
+
+
+def write_fixtures(workdir: Path, server: MockServer) -> Path:
+    inventory = {
+        "hosts": {
+            "dhis2": {"type": "dhis2", "baseUrl": server.url, "username": "admin", "password": "district"},
+            "icd11": {"type": "icd11", "baseUrl": server.url},
+            "icd10": {"type": "icd10", "baseUrl": server.url},
+            "fhir": {"type": "fhir", "baseUrl": f"{server.url}/fhir"},
+        },
+    }
+
+    fixtures = {
+        "inventory.json": inventory,
+        "svcm.json": {"source": {"id": "dhis2"}, "target": {"id": "fhir", "bundleSize": 500}},
+        "mcsd.json": {"source": {"id": "dhis2"}, "target": {"id": "fhir", "bundleSize": 500}},
+        "mcsd-stream.json": {"source": {"id": "dhis2", "pageSize": 0}, "target": {"id": "fhir", "bundleSize": 500}},
+    }
+
+    for name, data in fixtures.items():
+        with open(workdir / name, "w") as f:
+            json.dump(data, f, indent=2)
+
+    return workdir / "inventory.json"
+
+
+def run_command(args: List[str], env: Dict[str, str], log_file: Path) -> Dict[str, Any]:
+    """ Runs a command and waits for it with wait4, which also gives the peak RSS of the child """
+    with open(log_file, "wb") as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(args, env=env, stdout=subprocess.DEVNULL, stderr=log)
+        _, status, usage = os.wait4(process.pid, 0)
+        seconds = time.perf_counter() - start
+
+    process.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+    peak_rss = usage.ru_maxrss / (1024 * 1024 if "darwin" == sys.platform else 1024)  # bytes on macOS, KB on linux
+
+    return {"seconds": seconds, "peakRssMb": peak_rss, "returncode": process.returncode}
+
+
+def run_scenario(
+    scenario: Scenario,
+    server: MockServer,
+    inventory: Path,
+    env: Dict[str, str],
+    workdir: Path,
+    repeat: int,
+) -> Dict[str, Any]:
+    runs = []
+    log_file = workdir / f"{scenario.name}.log"
+
+    for _ in range(repeat):
+        server.reset_stats()
+        run = run_command([sys.executable, "-m", "dhis2", "-i", str(inventory), *scenario.args], env, log_file)
+        run.update(server.reset_stats())
+        runs.append(run)
+
+        if run["returncode"]:
+            with open(log_file, errors="replace") as f:
+                tail = f.readlines()[-10:]
+
+            print(f"{scenario.name} failed with exit code {run['returncode']}:\n{''.join(tail)}", file=sys.stderr)
+
+            return {"failed": True, "runs": runs}
+
+    seconds = [run["seconds"] for run in runs]
+    requests = runs[-1].get("requests", 0)
+    items = scenario.items(server.config)
+    median = statistics.median(seconds)
+
+    return {
+        "failed": False,
+        "items": items,
+        "seconds": median,
+        "secondsMin": min(seconds),
+        "secondsMax": max(seconds),
+        "itemsPerSecond": items / median if median else None,
+        "requests": requests,
+        "requestsPerSecond": requests / median if median else None,
+        "requestLatencyMs": runs[-1].get("microseconds", 0) / 1000 / requests if requests else None,
+        "bytesDownloaded": runs[-1].get("bytesOut", 0),  # server stats, in/out is from its side
+        "bytesUploaded": runs[-1].get("bytesIn", 0),
+        "peakRssMb": max(run["peakRssMb"] for run in runs),
+        "runs": runs,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    regressions = []
+
+    if results["config"] != baseline.get("config"):
+        print("Warning: the baseline was recorded with a different configuration", file=sys.stderr)
+
+    for name, result in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+
+        if not base or base.get("failed") or result.get("failed"):
+            continue
+
+        for key in ["seconds", "peakRssMb"]:
+            if base[key] and result[key] > base[key] * (1 + threshold):
+                change = result[key] / base[key] - 1
+                regressions.append(f"{name}: {key} {base[key]:.2f} => {result[key]:.2f} (+{change:.0%})")
+
+    return regressions
+
+
+def print_table(results: Dict[str, Any]) -> None:
+    columns = ["scenario", "seconds", "items/s", "requests", "req ms", "MB down", "MB up", "peak RSS MB"]
+    rows = [columns]
+
+    for name, r in results["scenarios"].items():
+        if r["failed"]:
+            rows.append([name, "failed"] + [""] * (len(columns) - 2))
+            continue
+
+        rows.append(
+            [
+                name,
+                f"{r['seconds']:.2f}",
+                f"{r['itemsPerSecond']:.0f}",
+                str(r["requests"]),
+                f"{r['requestLatencyMs']:.1f}" if r["requestLatencyMs"] is not None else "",
+                f"{r['bytesDownloaded'] / 1e6:.1f}",
+                f"{r['bytesUploaded'] / 1e6:.1f}",
+                f"{r['peakRssMb']:.0f}",
+            ]
+        )
+
+    widths = [max(len(row[idx]) for row in rows) for idx in range(len(columns))]
+
+    for row in rows:
+        print("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    scenario_names = [scenario.name for scenario in get_scenarios(Path("."))]
+
+    parser = argparse.ArgumentParser(description="Benchmark dhis2 commands against a local mock server")
+    parser.add_argument("--size", type=int, default=1000, help="Number of organisation units, other collections scale")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every mock response")
+    parser.add_argument("--icd-depth", type=int, default=4)
+    parser.add_argument("--icd-branching", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per scenario, the median is reported")
+    parser.add_argument("--scenario", action="append", choices=scenario_names, help="Only run these scenarios")
+    parser.add_argument("--output", help="Write the results as json")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown/memory growth (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    config = MockConfig.from_size(
+        args.size,
+        latency=args.latency,
+        icdDepth=args.icd_depth,
+        icdBranching=args.icd_branching,
+    )
+
+    server = MockServer(("127.0.0.1", 0), config)
+    server.start()
+
+    results: Dict[str, Any] = {
+        "config": config.dict(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "scenarios": {},
+    }
+
+    with tempfile.TemporaryDirectory(prefix="dhis2-bench-") as tmp:
+        workdir = Path(tmp)
+        inventory = write_fixtures(workdir, server)
+        env = {
+            **os.environ,
+            "PYTHONPATH": os.pathsep.join(filter(None, [str(SRC_DIR), os.environ.get("PYTHONPATH")])),
+            "DHIS2_CACHE_DIR": str(workdir / "cache"),
+        }
+
+        for scenario in get_scenarios(workdir):
+            if args.scenario and scenario.name not in args.scenario:
+                continue
+
+            print(f"Running {scenario.name} ({args.repeat}x)", file=sys.stderr)
+            results["scenarios"][scenario.name] = run_scenario(scenario, server, inventory, env, workdir, args.repeat)
+
+    server.shutdown()
+    print_table(results)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    failed = any(result["failed"] for result in results["scenarios"].values())
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+
+        for regression in regressions:
+            print(f"Regression: {regression}", file=sys.stderr)
+
+        failed = failed or bool(regressions)
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
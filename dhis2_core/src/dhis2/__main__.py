@@ -1,12 +1,18 @@
 #!/usr/bin/env python
 
+import sys
+
 import dhis2.core.logging  # noqa
 
 
 def main():
     from .core.cli import cli
+    from .core.http import HttpError
 
-    cli(obj={})
+    try:
+        cli(obj={})
+    except HttpError:  # reason is logged by BaseHttpRequest
+        sys.exit(-1)
 
 
 if __name__ == "__main__":
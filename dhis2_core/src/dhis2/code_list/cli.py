@@ -1,9 +1,12 @@
-import json
 import logging
 import sys
+from typing import Optional
 
 import click
+from dhis2.core.cache import ResponseCache
 from dhis2.core.inventory import resolve_one
+from dhis2.core.journal import open_journal
+from dhis2.core.serializer import dump
 from dhis2.core.utils import parse_file
 
 from . import svcm
@@ -13,6 +16,39 @@ from .icd10 import fetch_icd10_dhis2_option_sets
 log = logging.getLogger(__name__)
 
 
+def echo_json(data):
+    stdout = click.get_text_stream("stdout")
+    dump(data, stdout, indent=2)
+    stdout.write("\n")
+
+
+def cache_options(fn):
+    fn = click.option("--offline", is_flag=True, help="Only serve responses from the cache")(fn)
+    fn = click.option("--no-cache", is_flag=True, help="Disable the response cache")(fn)
+    fn = click.option("--cache-max-size", default=512, type=click.IntRange(min=1), help="Cache size in MB")(fn)
+    fn = click.option("--cache-dir", type=click.Path(file_okay=False), help="Cache directory")(fn)
+
+    return fn
+
+
+def checkpoint_options(fn):
+    fn = click.option("--resume", is_flag=True, help="Resume from the checkpoint file")(fn)
+    fn = click.option("--checkpoint", type=click.Path(dir_okay=False), help="Checkpoint file for resuming")(fn)
+
+    return fn
+
+
+def get_cache(cache_dir: str, cache_max_size: int, no_cache: bool, offline: bool) -> Optional[ResponseCache]:
+    if no_cache:
+        if offline:
+            log.error("Offline mode requires the cache to be enabled")
+            sys.exit(-1)
+
+        return None
+
+    return ResponseCache(cache_dir, cache_max_size * 1024 * 1024, offline)
+
+
 @click.group("code-list")
 def cli_code_list():
     """ Various commands for code-list data exchange """
@@ -25,6 +61,9 @@ def cli_code_list():
 @click.option("--release-id", default="2020-09")
 @click.option("--language", default="en")
 @click.option("--root-id")
+@click.option("--concurrency", default=1, type=click.IntRange(min=1), help="Number of parallel requests")
+@cache_options
+@checkpoint_options
 @click.pass_obj
 def cmd_code_list_icd11(
     ctx,
@@ -33,6 +72,13 @@ def cmd_code_list_icd11(
     release_id: str,
     language: str,
     root_id: str,
+    concurrency: int,
+    cache_dir: str,
+    cache_max_size: int,
+    no_cache: bool,
+    offline: bool,
+    checkpoint: str,
+    resume: bool,
 ):
     """ Generate dhis2 option sets from icd11 source **experimental** """
     host = resolve_one(host_id, ctx.inventory)
@@ -41,16 +87,42 @@ def cmd_code_list_icd11(
         log.error(f"Invalid source type '{host.type}', only 'icd11' sources are allowed")
         sys.exit(-1)
 
-    option_sets = fetch_icd11_dhis2_option_sets(
-        host,
-        linearizationname=linearizationname,
-        release_id=release_id,
-        language=language,
-        root_id=root_id,
+    if concurrency > host.http.poolMaxSize:
+        log.warning(
+            f"Concurrency {concurrency} is larger than the connection pool size {host.http.poolMaxSize} "
+            f"of '{host.key}', consider increasing 'http.poolMaxSize' in the inventory"
+        )
+
+    journal = open_journal(
+        checkpoint,
+        {
+            "type": "icd11",
+            "baseUrl": host.baseUrl,
+            "linearizationname": linearizationname,
+            "releaseId": release_id,
+            "language": language,
+            "rootId": root_id,
+        },
+        resume,
     )
 
+    try:
+        option_sets = fetch_icd11_dhis2_option_sets(
+            host,
+            linearizationname=linearizationname,
+            release_id=release_id,
+            language=language,
+            root_id=root_id,
+            concurrency=concurrency,
+            cache=get_cache(cache_dir, cache_max_size, no_cache, offline),
+            journal=journal,
+        )
+    finally:
+        if journal:
+            journal.close()
+
     if option_sets:
-        click.echo(json.dumps(option_sets, indent=2, ensure_ascii=False))
+        echo_json(option_sets)
 
 
 @cli_code_list.command("icd10")
@@ -58,6 +130,8 @@ def cmd_code_list_icd11(
 @click.option("--release-id", default="2016")
 @click.option("--language", default="en")
 @click.option("--root-id")
+@cache_options
+@checkpoint_options
 @click.pass_obj
 def cmd_code_list_icd10(
     ctx,
@@ -65,6 +139,12 @@ def cmd_code_list_icd10(
     release_id: str,
     language: str,
     root_id: str,
+    cache_dir: str,
+    cache_max_size: int,
+    no_cache: bool,
+    offline: bool,
+    checkpoint: str,
+    resume: bool,
 ):
     """ Generate dhis2 option sets from icd10 source **experimental** """
     host = resolve_one(host_id, ctx.inventory)
@@ -73,22 +153,43 @@ def cmd_code_list_icd10(
         log.error(f"Invalid source type '{host.type}', only 'icd10' sources are allowed")
         sys.exit(-1)
 
-    option_sets = fetch_icd10_dhis2_option_sets(
-        host,
-        release_id=release_id,
-        language=language,
-        root_id=root_id,
+    journal = open_journal(
+        checkpoint,
+        {
+            "type": "icd10",
+            "baseUrl": host.baseUrl,
+            "releaseId": release_id,
+            "language": language,
+            "rootId": root_id,
+        },
+        resume,
     )
 
+    try:
+        option_sets = fetch_icd10_dhis2_option_sets(
+            host,
+            release_id=release_id,
+            language=language,
+            root_id=root_id,
+            cache=get_cache(cache_dir, cache_max_size, no_cache, offline),
+            journal=journal,
+        )
+    finally:
+        if journal:
+            journal.close()
+
     if option_sets:
-        click.echo(json.dumps(option_sets, indent=2, ensure_ascii=False))
+        echo_json(option_sets)
 
 
 @cli_code_list.command("svcm")
 @click.argument("config")
 @click.option("--last-updated")
+@click.option("--incremental", is_flag=True, help="Only push code lists that changed since the last run")
+@click.option("--state-dir", type=click.Path(file_okay=False), help="Directory for the sync state files")
+@click.option("--fast", is_flag=True, help="Build FHIR json directly, skipping resource validation")
 @click.pass_obj
-def cmd_openhie_svcm(ctx, config: str, last_updated: str):
+def cmd_openhie_svcm(ctx, config: str, last_updated: str, incremental: bool, state_dir: str, fast: bool):
     """ OpenHIE Sharing Valuesets, Codes, and Maps (SVCM) """
     svcm_config = {
         "source": {},
@@ -108,7 +209,13 @@ def cmd_openhie_svcm(ctx, config: str, last_updated: str):
     if last_updated:
         svcm_config["source"]["lastUpdated"] = last_updated
 
-    svcm.run(svcm.SVCMConfig(**svcm_config), ctx.inventory)
+    if fast:
+        svcm_config["fast"] = True
+
+    if incremental:
+        svcm_config["incremental"] = True
+
+    svcm.run(svcm.SVCMConfig(**svcm_config), ctx.inventory, state_dir=state_dir)
 
 
 def register_cli(cli):
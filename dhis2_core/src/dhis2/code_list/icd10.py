@@ -1,8 +1,10 @@
 import logging
-from typing import List
+from typing import List, Optional
 
+from dhis2.core.cache import ResponseCache
 from dhis2.core.http import BaseHttpRequest
 from dhis2.core.inventory import HostResolved
+from dhis2.core.journal import CheckpointJournal
 
 from .models.icd10 import ICD10Entity
 
@@ -14,20 +16,35 @@ def _icd10_fetch(
     release_id: str,
     language: str,
     id: str,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CheckpointJournal] = None,
 ):
-    req = BaseHttpRequest(host)
     url = f"icd/release/10/{release_id}"
 
     if id:
         url = f"icd/release/10/{release_id}/{id}"
 
-    data = req.get(
-        url,
-        headers={
-            "Accept-Language": language,
-            "API-Version": "v2",
-        },
-    )
+    def fetch():
+        req = BaseHttpRequest(host)
+
+        return req.get(
+            url,
+            headers={
+                "Accept-Language": language,
+                "API-Version": "v2",
+            },
+        )
+
+    def load():
+        if cache:
+            return cache.fetch(cache.key(host.baseUrl, "icd10", release_id, language, id), fetch)
+
+        return fetch()
+
+    if journal:
+        data = journal.fetch(id or "", load)
+    else:
+        data = load()
 
     return ICD10Entity(**data)
 
@@ -37,6 +54,8 @@ def _icd10_resolve_children(
     host: HostResolved,
     release_id: str,
     language: str,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CheckpointJournal] = None,
 ) -> List[ICD10Entity]:
     children: List[ICD10Entity] = []
 
@@ -50,7 +69,7 @@ def _icd10_resolve_children(
             id = f"{parts[7]}/{parts[8]}"
 
         if id:
-            ch = _icd10_fetch(host, release_id, language, id)
+            ch = _icd10_fetch(host, release_id, language, id, cache, journal)
 
             if "category" == ch.classKind or "modifiedcategory" == ch.classKind:
                 children.append(ch)
@@ -62,6 +81,8 @@ def _icd10_resolve_children(
                         host,
                         release_id,
                         language,
+                        cache,
+                        journal,
                     )
                 )
 
@@ -73,9 +94,11 @@ def _icd10_fetch_all(
     release_id: str,
     language: str,
     root_id: str,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CheckpointJournal] = None,
 ) -> ICD10Entity:
-    root = _icd10_fetch(host, release_id, language, id=root_id)
-    root.child = _icd10_resolve_children(root.child, host, release_id, language)
+    root = _icd10_fetch(host, release_id, language, id=root_id, cache=cache, journal=journal)
+    root.child = _icd10_resolve_children(root.child, host, release_id, language, cache, journal)
 
     return root
 
@@ -113,10 +136,12 @@ def fetch_icd10_dhis2_option_sets(
     release_id: str,
     language: str,
     root_id: str,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CheckpointJournal] = None,
 ):
     log.info("ICD10 export job started")
 
-    icd10 = _icd10_fetch_all(host, release_id, language, root_id)
+    icd10 = _icd10_fetch_all(host, release_id, language, root_id, cache, journal)
 
     log.info("Converting to DHIS2 optionset/options payload")
     dhis2 = _dhis2_make_option_sets(icd10)
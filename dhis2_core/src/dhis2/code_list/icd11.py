@@ -1,8 +1,11 @@
 import logging
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
 
+from dhis2.core.cache import ResponseCache
 from dhis2.core.http import BaseHttpRequest
 from dhis2.core.inventory import HostResolved
+from dhis2.core.journal import CheckpointJournal
 
 from .models.icd11 import LinearizationEntity
 
@@ -15,58 +18,103 @@ def _icd11_fetch(
     release_id: str,
     language: str,
     id: str,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CheckpointJournal] = None,
 ):
-    req = BaseHttpRequest(host)
     url = f"icd/release/11/{release_id}/{linearizationname}"
 
     if id:
         url = f"icd/release/11/{release_id}/{linearizationname}/{id}"
 
-    data = req.get(
-        url,
-        headers={
-            "Accept-Language": language,
-            "API-Version": "v2",
-        },
-    )
+    def fetch():
+        req = BaseHttpRequest(host)
+
+        return req.get(
+            url,
+            headers={
+                "Accept-Language": language,
+                "API-Version": "v2",
+            },
+        )
+
+    def load():
+        if cache:
+            return cache.fetch(cache.key(host.baseUrl, "icd11", release_id, linearizationname, language, id), fetch)
+
+        return fetch()
+
+    if journal:
+        data = journal.fetch(id or "", load)
+    else:
+        data = load()
 
     return LinearizationEntity(**data)
 
 
-def _icd11_resolve_children(
-    child: List[LinearizationEntity],
+def _icd11_child_id(child: str) -> Union[str, None]:
+    parts = child.split("/")
+
+    if 9 == len(parts):
+        return parts[8]
+    elif 10 == len(parts):
+        return f"{parts[8]}/{parts[9]}"
+
+    return None
+
+
+def _icd11_fetch_tree(
+    root: LinearizationEntity,
     host: HostResolved,
     linearizationname: str,
     release_id: str,
     language: str,
+    concurrency: int = 1,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CheckpointJournal] = None,
+) -> Dict[str, LinearizationEntity]:
+    entities: Dict[str, LinearizationEntity] = {}
+    frontier = [id for id in map(_icd11_child_id, root.child) if id]
+
+    def fetch(id: str) -> LinearizationEntity:
+        return _icd11_fetch(host, linearizationname, release_id, language, id, cache, journal)
+
+    with ThreadPoolExecutor(max_workers=max(concurrency, 1)) as executor:
+        # fetch the tree level by level, all entities of a level are fetched in parallel
+        while frontier:
+            log.info(f"Fetching {len(frontier)} ICD11 entities")
+
+            for id, ch in zip(frontier, executor.map(fetch, frontier)):
+                entities[id] = ch
+
+            frontier = list(
+                dict.fromkeys(
+                    id
+                    for ch in map(entities.get, frontier)
+                    for id in map(_icd11_child_id, ch.child)
+                    if id and id not in entities
+                )
+            )
+
+    return entities
+
+
+def _icd11_resolve_children(
+    child: List[str],
+    entities: Dict[str, LinearizationEntity],
 ) -> List[LinearizationEntity]:
     children: List[LinearizationEntity] = []
 
     for c in child:
-        parts = c.split("/")
-        id = None
-
-        if 9 == len(parts):
-            id = parts[8]
-        elif 10 == len(parts):
-            id = f"{parts[8]}/{parts[9]}"
+        id = _icd11_child_id(c)
 
         if id:
-            ch = _icd11_fetch(host, linearizationname, release_id, language, id)
+            ch = entities[id]
 
             if "category" == ch.classKind:
                 children.append(ch)
 
             if ch.child:
-                children.extend(
-                    _icd11_resolve_children(
-                        ch.child,
-                        host,
-                        linearizationname,
-                        release_id,
-                        language,
-                    )
-                )
+                children.extend(_icd11_resolve_children(ch.child, entities))
 
     return children
 
@@ -77,9 +125,13 @@ def _icd11_fetch_all(
     release_id: str,
     language: str,
     root_id: str,
+    concurrency: int = 1,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CheckpointJournal] = None,
 ) -> LinearizationEntity:
-    root = _icd11_fetch(host, linearizationname, release_id, language, id=root_id)
-    root.child = _icd11_resolve_children(root.child, host, linearizationname, release_id, language)
+    root = _icd11_fetch(host, linearizationname, release_id, language, id=root_id, cache=cache, journal=journal)
+    entities = _icd11_fetch_tree(root, host, linearizationname, release_id, language, concurrency, cache, journal)
+    root.child = _icd11_resolve_children(root.child, entities)
 
     return root
 
@@ -123,10 +175,13 @@ def fetch_icd11_dhis2_option_sets(
     release_id: str,
     language: str,
     root_id: str,
+    concurrency: int = 1,
+    cache: Optional[ResponseCache] = None,
+    journal: Optional[CheckpointJournal] = None,
 ):
     log.info("ICD11 export job started")
 
-    icd11 = _icd11_fetch_all(host, linearizationname, release_id, language, root_id)
+    icd11 = _icd11_fetch_all(host, linearizationname, release_id, language, root_id, concurrency, cache, journal)
 
     log.info("Converting to DHIS2 optionset/options payload")
     dhis2 = _dhis2_make_option_sets(icd11)
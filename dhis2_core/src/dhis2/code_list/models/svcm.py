@@ -25,11 +25,15 @@ class SVCMSource(BaseSource):
 
 
 class SVCMTarget(BaseTarget):
-    pass
+    bundleSize: Optional[int] = Field(None, gt=1)  # max number of entries per bundle, unbounded if not set
+    parallel: int = Field(1, gt=0)  # number of bundles pushed in parallel
 
 
 class SVCMConfig(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid4()))
+    fast: bool = False  # build FHIR json directly instead of through fhir.resources
+    validateSample: float = Field(0.0, ge=0.0, le=1.0)  # fraction of fast built resources to validate
+    incremental: bool = False  # only push code lists that changed since the last run
     source: SVCMSource
     target: SVCMTarget
 
@@ -1,14 +1,19 @@
+import hashlib
 import json
 import logging
 import sys
-from typing import Any, Callable, Dict, List
+from collections import Counter
+from itertools import chain
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple
 
 from dhis2.core.http import BaseHttpRequest
 from dhis2.core.inventory import HostResolved, Inventory, resolve_one
-from fhir.resources.bundle import Bundle
+from dhis2.core.serializer import dump
+from dhis2.core.state import load_state, save_state
+from dhis2.core.utils import bounded_map
 
 from .models.svcm import CodeList, SVCMConfig
-from .svcm_resources import build_bundle
+from .svcm_resources import build_bundles
 
 log = logging.getLogger(__name__)
 
@@ -68,7 +73,12 @@ def get_source(config: SVCMConfig, inventory: Inventory) -> Callable[[Any], Any]
     return fn
 
 
-def get_target(config: SVCMConfig, inventory: Inventory) -> Callable[[Any], Any]:
+def get_target(
+    config: SVCMConfig,
+    inventory: Inventory,
+    hashes: Optional[Dict[str, str]] = None,
+) -> Callable[[Any], Any]:
+    """ A push target adds the hashes of a bundle's code lists to `hashes` once it is posted """
     id = config.target.id
 
     if "log://" == id:
@@ -77,7 +87,10 @@ def get_target(config: SVCMConfig, inventory: Inventory) -> Callable[[Any], Any]
 
         def target_log(data: Any):
             log.info("Writing result to stdout")
-            print(json.dumps(data[1].as_json(), indent=2))
+
+            for bundle, _ in data[1]:
+                dump(bundle, sys.stdout, indent=2)
+                sys.stdout.write("\n")
 
         return target_log
     elif "null://" == id:
@@ -87,6 +100,9 @@ def get_target(config: SVCMConfig, inventory: Inventory) -> Callable[[Any], Any]
         def target_null(data: Any):
             log.info("Doing nothing with result")
 
+            for _ in data[1]:  # still build the bundles
+                pass
+
         return target_null
 
     host = resolve_one(id, inventory)
@@ -97,45 +113,133 @@ def get_target(config: SVCMConfig, inventory: Inventory) -> Callable[[Any], Any]
 
     log.info(f"Creating target from '{host.key}' with base url '{host.baseUrl}'")
 
-    def target_push(data: Any):
-        payload: Bundle = data[1]
-        return BaseHttpRequest(host).post("", data=payload.as_json())
+    def push(item: Tuple[int, Tuple[Dict[str, Any], Dict[str, str]]]) -> Dict[str, str]:
+        idx, (bundle, bundle_hashes) = item
+        response = BaseHttpRequest(host).post("", data=bundle)
+
+        statuses = Counter(entry.get("response", {}).get("status") for entry in response.get("entry", []))
+        log.info(f"Pushed bundle {idx} with {len(bundle['entry'])} entries, got response statuses {dict(statuses)}")
+
+        return bundle_hashes
+
+    def target_push(data: Any) -> int:
+        bundles = (item for item in data[1] if item[0].get("entry"))  # skip empty
+        count = 0
+
+        for bundle_hashes in bounded_map(push, enumerate(bundles, 1), config.target.parallel):
+            count += 1
+
+            if hashes is not None:
+                hashes.update(bundle_hashes)
+
+        return count
 
     return target_push
 
 
-def transform(config: SVCMConfig, data: Any):
+def hash_code_list(data: Dict[str, Any]) -> str:
+    # hash of the source payload (id, version, codes, translations etc) of a single code list
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def filter_changed(
+    code_lists: Iterable[Tuple[str, Dict[str, Any]]],
+    hashes: Dict[str, str],
+    changed: Dict[str, str],
+):
+    # yields code lists changed since last run, their hashes are added to `changed` when consumed
+    skipped = 0
+
+    for type, data in code_lists:
+        key = f"{type}/{data.get('id')}"
+        hash = hash_code_list(data)
+
+        if hashes.get(key) == hash:
+            skipped += 1
+            continue
+
+        changed[key] = hash
+
+        yield type, data
+
+    log.info(f"Skipped {skipped} unchanged code lists")
+
+
+def with_hashes(
+    bundles: Iterable[Dict[str, Any]],
+    changed: Dict[str, str],
+) -> Iterator[Tuple[Dict[str, Any], Dict[str, str]]]:
+    # bundles are built lazily from the filtered code lists, so everything added to `changed` since
+    # the previous bundle is in this one
+    for bundle in bundles:
+        bundle_hashes = dict(changed)
+        changed.clear()
+
+        yield bundle, bundle_hashes
+
+
+def transform(config: SVCMConfig, data: Any, hashes: Optional[Dict[str, str]] = None):
     host: HostResolved = data[0]
     payload: Dict[str, Any] = data[1]
 
-    code_lists: List[CodeList] = []
-
     option_sets = payload.get("optionSets", [])
     categories = payload.get("categories", [])
 
-    for option_set in option_sets:
-        code_lists.append(CodeList(**option_set))
+    source = chain(
+        (("optionSets", option_set) for option_set in option_sets),
+        (("categories", category) for category in categories),
+    )
+
+    changed: Dict[str, str] = {}
 
-    for category in categories:
-        code_lists.append(CodeList(**category, type="categories"))
+    if hashes is not None:
+        source = filter_changed(source, hashes, changed)
 
+    code_lists: Iterator[CodeList] = (CodeList(**data, type=type) for type, data in source)
+
+    bundles = build_bundles(
+        code_lists,
+        host.baseUrl,
+        bundle_size=config.target.bundleSize,
+        fast=config.fast,
+        validate_sample=config.validateSample,
+    )
+
+    # (bundle, hashes of its changed code lists), the hashes are only recorded once it is pushed
     return (
         host,
-        build_bundle(code_lists, host.baseUrl),
+        with_hashes(bundles, changed),
     )
 
 
-def run(config: SVCMConfig, inventory: Inventory):
+def run(config: SVCMConfig, inventory: Inventory, state_dir: Optional[str] = None):
     log.info(f"SVCM job '{config.id}'' starting")
 
+    hashes = None
+
+    if config.incremental:
+        # the default id is random for every run, state can only be kept for jobs with a stable id
+        if "id" not in config.__fields_set__:
+            log.error("Incremental SVCM jobs require an 'id' in the SVCM config")
+            sys.exit(-1)
+
+        hashes = load_state("svcm", config.id, state_dir).get("codeLists", {})
+
+    # the log:// and null:// targets don't push anything, so the state is left as is
+    persist = hashes is not None and config.target.id not in ["log://", "null://"]
+
     source = get_source(config, inventory)
-    target = get_target(config, inventory)
+    target = get_target(config, inventory, hashes)
 
-    data = source()
-    data = transform(config, data)
-    data = target(data)
+    try:
+        data = source()
+        data = transform(config, data, hashes)
+        data = target(data)
+    finally:
+        if persist:  # also after a failed push, hashes only has code lists that were pushed
+            save_state("svcm", config.id, {"codeLists": hashes}, state_dir)
 
     if data:
-        log.info(f"Got response from target system {data}")
+        log.info(f"Got {data} responses from target system")
 
     log.info(f"SVCM job '{config.id}' finished")
@@ -1,5 +1,10 @@
+import json
 import logging
-from typing import List
+import random
+import sys
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from dhis2.core.utils import chunked, compact
 
 from fhir.resources.bundle import Bundle, BundleEntry, BundleEntryRequest
 from fhir.resources.codesystem import CodeSystem, CodeSystemConcept
@@ -102,15 +107,142 @@ def build_value_set_bundle_entry(code_list: CodeList, base_url: str) -> BundleEn
     return entry
 
 
-def build_bundle(code_lists: List[CodeList], base_url: str) -> Bundle:
+def build_bundle(code_lists: Iterable[CodeList], base_url: str) -> Bundle:
     bundle = Bundle()
     bundle.type = "transaction"
     bundle.entry = []
 
-    log.info(f"Building FHIR bundle from '{len(code_lists)}' DHIS2 code lists")
+    log.info("Building FHIR bundle from DHIS2 code lists")
 
     for code_list in code_lists:
         bundle.entry.append(build_value_set_bundle_entry(code_list, base_url))
         bundle.entry.append(build_code_system_bundle_entry(code_list, base_url))
 
+    log.info(f"Built FHIR bundle from '{len(bundle.entry) // 2}' DHIS2 code lists")
+
     return bundle
+
+
+# the *_json builders below produce the same json as `.as_json()` of the resources built above,
+# but without creating (and validating) fhir.resources models, keys are in fhir.resources order
+
+
+def build_identifiers_json(code_list: CodeList, base_url: str) -> List[Dict[str, Any]]:
+    identifiers = [{"system": f"{base_url}/api/{code_list.type}", "value": code_list.id}]
+
+    if code_list.code:
+        identifiers.append({"system": f"{base_url}/api/{code_list.type}", "value": code_list.code})
+
+    return identifiers
+
+
+def build_svcm_codesystem_json(code_list: CodeList, base_url: str) -> Dict[str, Any]:
+    concept = []
+
+    for code in code_list.codes:
+        concept.append(compact({"code": code.code, "definition": code.name, "display": code.name}))
+
+    return compact(
+        {
+            "caseSensitive": True,
+            "concept": concept or None,
+            "content": "complete",
+            "description": code_list.name,
+            "experimental": False,
+            "identifier": build_identifiers_json(code_list, base_url),
+            "name": code_list.name,
+            "publisher": base_url,
+            "status": "active",
+            "title": code_list.name,
+            "url": f"{base_url}/api/{code_list.type}/{code_list.id}/codeSystem",
+            "valueSet": f"{base_url}/api/{code_list.type}/{code_list.id}/valueSet",
+            "version": str(code_list.version),
+            "resourceType": "CodeSystem",
+        }
+    )
+
+
+def build_svcm_valueset_json(code_list: CodeList, base_url: str) -> Dict[str, Any]:
+    return compact(
+        {
+            "compose": {
+                "include": [
+                    {"system": f"{base_url}/api/{code_list.type}/{code_list.id}/codeSystem"},
+                ]
+            },
+            "description": code_list.name,
+            "experimental": False,
+            "identifier": build_identifiers_json(code_list, base_url),
+            "immutable": True,
+            "name": code_list.name,
+            "status": "active",
+            "title": code_list.name,
+            "url": f"{base_url}/api/{code_list.type}/{code_list.id}/valueSet",
+            "version": str(code_list.version),
+            "resourceType": "ValueSet",
+        }
+    )
+
+
+def build_bundle_entries_json(code_list: CodeList, base_url: str) -> List[Dict[str, Any]]:
+    return [
+        {
+            "request": {"method": "PUT", "url": f"ValueSet?identifier={code_list.id}"},
+            "resource": build_svcm_valueset_json(code_list, base_url),
+        },
+        {
+            "request": {"method": "PUT", "url": f"CodeSystem?identifier={code_list.id}"},
+            "resource": build_svcm_codesystem_json(code_list, base_url),
+        },
+    ]
+
+
+def validate_bundle_entries_json(code_list: CodeList, base_url: str, entries: List[Dict[str, Any]]):
+    expected = [
+        build_value_set_bundle_entry(code_list, base_url).as_json(),
+        build_code_system_bundle_entry(code_list, base_url).as_json(),
+    ]
+
+    if json.dumps(expected) != json.dumps(entries):
+        log.error(f"Fast and validated FHIR resources differ for code list '{code_list.id}'")
+        sys.exit(-1)
+
+
+def build_bundle_json(code_lists: Iterable[CodeList], base_url: str, validate_sample: float = 0.0) -> Dict[str, Any]:
+    entry = []
+
+    log.info("Building FHIR bundle from DHIS2 code lists")
+
+    for code_list in code_lists:
+        entries = build_bundle_entries_json(code_list, base_url)
+
+        if validate_sample and random.random() < validate_sample:
+            validate_bundle_entries_json(code_list, base_url, entries)
+
+        entry.extend(entries)
+
+    log.info(f"Built FHIR bundle from '{len(entry) // 2}' DHIS2 code lists")
+
+    return compact({"entry": entry or None, "type": "transaction", "resourceType": "Bundle"})
+
+
+def build_bundles(
+    code_lists: Iterable[CodeList],
+    base_url: str,
+    bundle_size: Optional[int] = None,
+    fast: bool = False,
+    validate_sample: float = 0.0,
+) -> Iterator[Dict[str, Any]]:
+    def build(code_lists: Iterable[CodeList]) -> Dict[str, Any]:
+        if fast:
+            return build_bundle_json(code_lists, base_url, validate_sample)
+
+        return build_bundle(code_lists, base_url).as_json()
+
+    if not bundle_size:
+        yield build(code_lists)
+        return
+
+    # every code list is added as both a value set and a code system entry
+    for chunk in chunked(code_lists, bundle_size // 2):
+        yield build(chunk)
@@ -0,0 +1,124 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Optional, Union
+
+log = logging.getLogger(__name__)
+
+
+def default_cache_dir() -> Path:
+    if "DHIS2_CACHE_DIR" in os.environ:
+        return Path(os.environ["DHIS2_CACHE_DIR"])
+
+    return Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "dhis2"
+
+
+class ResponseCache:
+    """
+    Content addressed on-disk cache for immutable responses, evicting least recently used entries
+    """
+
+    def __init__(
+        self,
+        path: Optional[Union[Path, str]] = None,
+        max_size: int = 512 * 1024 * 1024,
+        offline: bool = False,
+    ):
+        self.path = Path(path) if path else default_cache_dir() / "responses"
+        self.max_size = max_size
+        self.offline = offline
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def key(self, *parts: Any) -> str:
+        return hashlib.sha256(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Any:
+        fp = self._get_path(key)
+
+        try:
+            with open(fp, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            os.utime(fp)  # mark as recently used
+        except OSError:
+            pass
+
+        return data
+
+    def put(self, key: str, data: Any) -> None:
+        fp = self._get_path(key)
+        fp.parent.mkdir(parents=True, exist_ok=True)
+
+        tmp = fp.with_name(f"{fp.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+
+        with self._lock:
+            try:
+                replaced = fp.stat().st_size  # an overwritten entry no longer counts
+            except OSError:
+                replaced = 0
+
+            os.replace(tmp, fp)
+
+            if self._size is None:
+                self._size = sum(f.stat().st_size for f in self.path.glob("*/*.json"))
+            else:
+                self._size += fp.stat().st_size - replaced
+
+            if self._size > self.max_size:
+                self._evict()
+
+    def fetch(self, key: str, fn: Callable[[], Any]) -> Any:
+        data = self.get(key)
+
+        if data is not None:
+            return data
+
+        if self.offline:
+            log.error(f"Cache miss for key '{key}' while running in offline mode")
+            sys.exit(-1)
+
+        data = fn()
+        self.put(key, data)
+
+        return data
+
+    def _evict(self):
+        files = []
+
+        for fp in self.path.glob("*/*.json"):
+            try:
+                stat = fp.stat()
+            except OSError:
+                continue
+
+            files.append((stat.st_mtime, stat.st_size, fp))
+
+        files.sort()
+        self._size = sum(size for _, size, _ in files)
+
+        for _, size, fp in files:
+            if self._size <= self.max_size:
+                break
+
+            try:
+                fp.unlink()
+            except OSError:
+                continue
+
+            self._size -= size
+
+        log.debug(f"Evicted cache entries from '{self.path}', new size is {self._size} bytes")
+
+    def _get_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
@@ -1,21 +1,105 @@
+import importlib
+import json
+import logging
 import os
+from importlib.metadata import entry_points
+from typing import Dict, List, Tuple
 
 import click
-import dhis2.code_list.cli as cli_code_list
-import dhis2.facility_list.cli as cli_facility_list
-import dhis2.generate.cli as cli_generator
-import dhis2.e2b.cli as cli_e2b
-from pkg_resources import iter_entry_points
 
 from .inspect import inspect
-from .inventory import Inventory, parse_file, parse_obj, resolve
+from .inventory import Inventory, parse_file, parse_file_cached, parse_obj, resolve
+
+log = logging.getLogger(__name__)
 
 defaultInventory = {"hosts": {}, "groups": {}}
 
+# built-in plugins, command name => (module with a register_cli function, short help)
+plugins: Dict[str, Tuple[str, str]] = {
+    "code-list": ("dhis2.code_list.cli", "Various commands for code-list data exchange"),
+    "facility-list": ("dhis2.facility_list.cli", "Various commands for facility-list data exchange"),
+    "generate": ("dhis2.generate.cli", "Various commands for generating data/schemas"),
+    "e2b": ("dhis2.e2b.cli", "Individual Case Safety Reports E2B (R2)"),
+}
+
+
+def iter_plugin_entry_points(group: str = "dhis2.plugin"):
+    eps = entry_points()
+
+    if hasattr(eps, "select"):
+        return eps.select(group=group)
+
+    return eps.get(group, [])  # python < 3.10
+
+
+class LazyGroup(click.Group):
+    """ Group that only imports a plugin when one of its commands is invoked """
+
+    def __init__(self, *args, lazy_commands: Dict[str, Tuple[str, str]] = {}, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lazy_commands = dict(lazy_commands)
+        self.entry_points_loaded = False
+        self.entry_point_errors: Dict[str, Exception] = {}
+
+    def load_entry_points(self):
+        if self.entry_points_loaded:
+            return
+
+        self.entry_points_loaded = True
+
+        for entry_point in iter_plugin_entry_points():
+            try:
+                entry_point.load()(self)
+            except Exception as e:  # noqa
+                # other commands keep working, invoking the broken plugin raises the error again
+                log.error(f"Failed to load plugin '{entry_point.name}'", exc_info=True)
+                self.entry_point_errors[entry_point.name] = e
+
+    def list_commands(self, ctx) -> List[str]:
+        self.load_entry_points()
+        return sorted(set(super().list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name: str):
+        if name not in self.commands and name in self.lazy_commands:
+            module, _ = self.lazy_commands[name]
+            importlib.import_module(module).register_cli(self)
+
+        if name not in self.commands:
+            self.load_entry_points()
+
+        if name not in self.commands and name in self.entry_point_errors:
+            raise self.entry_point_errors[name]
+
+        return self.commands.get(name)
+
+    def format_commands(self, ctx, formatter):
+        # like click.Group.format_commands, but uses the registered help for plugins not loaded yet
+        rows = []
+
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                cmd = self.commands[name]
+
+                if cmd.hidden:
+                    continue
+
+                rows.append((name, cmd.get_short_help_str(formatter.width - 6 - len(name))))
+            else:
+                rows.append((name, self.lazy_commands[name][1]))
+
+        if rows:
+            with formatter.section("Commands"):
+                formatter.write_dl(rows)
+
 
 class CliContext(object):
-    def __init__(self, inventory=None, debug=False):
-        if inventory:
+    def __init__(self, inventory=None, debug=False, inventory_cache=True, inventory_cache_credentials=False):
+        if inventory and inventory_cache:
+            self.inventory: Inventory = parse_file_cached(
+                os.path.abspath(inventory),
+                credentials=inventory_cache_credentials,
+            )
+        elif inventory:
             self.inventory: Inventory = parse_file(os.path.abspath(inventory))
         else:
             self.inventory: Inventory = parse_obj(defaultInventory)
@@ -23,23 +107,49 @@ class CliContext(object):
         self.debug = debug
 
 
-@click.group()
+@click.group(cls=LazyGroup, lazy_commands=plugins)
 @click.version_option()
 @click.option("-i", "--inventory", metavar="INVENTORY")
 @click.option("-d", "--debug", is_flag=True)
+@click.option("--no-inventory-cache", is_flag=True, help="Always parse and validate the inventory file")
+@click.option(
+    "--inventory-cache-credentials",
+    is_flag=True,
+    envvar="DHIS2_INVENTORY_CACHE_CREDENTIALS",
+    help="Also cache inventories with credentials (stored in plain text, readable only by the current user)",
+)
 @click.pass_context
-def cli(ctx, inventory, debug):
+def cli(ctx, inventory, debug, no_inventory_cache, inventory_cache_credentials):
     """ DHIS2 Tool for helping with import/export of various formats. """
-    ctx.obj = CliContext(inventory, debug)
+    ctx.obj = CliContext(
+        inventory,
+        debug,
+        inventory_cache=not no_inventory_cache,
+        inventory_cache_credentials=inventory_cache_credentials,
+    )
 
 
 @cli.command("inspect")
 @click.argument("id")
+@click.option("--format", "output_format", type=click.Choice(["table", "json"]), default="table")
+@click.option("--concurrency", default=16, type=click.IntRange(min=1), help="Number of hosts inspected in parallel")
+@click.option("--timeout", default=10.0, type=click.FloatRange(min=0.1), help="Total time allowed per host in seconds")
 @click.pass_obj
-def cmd_inspect(ctx, id):
+def cmd_inspect(ctx, id, output_format, concurrency, timeout):
     """ Display basic dhis2 instance information """
     hosts = resolve(id, ctx.inventory)
-    inspect(hosts)
+    reports = inspect(hosts, concurrency=concurrency, timeout=timeout)
+
+    if "json" == output_format:
+        click.echo(json.dumps(reports, indent=2))
+        return
+
+    columns = ["host", "version", "revision", "lastAnalyticsTableRuntime", "cpuCores", "databaseVersion", "error"]
+    rows = [columns] + [["" if report[c] is None else str(report[c]) for c in columns] for report in reports]
+    widths = [max(len(row[idx]) for row in rows) for idx in range(len(columns))]
+
+    for row in rows:
+        click.echo("  ".join(value.ljust(width) for value, width in zip(row, widths)).rstrip())
 
 
 @cli.group("inventory")
@@ -63,13 +173,3 @@ def cmd_inventory_resolve(ctx, id):
 
     for host in hosts:
         click.echo(host.json())
-
-
-cli_code_list.register_cli(cli)  # register "code-list" plugin
-cli_facility_list.register_cli(cli)  # register "facility-list" plugin
-cli_generator.register_cli(cli)  # register "generator" plugin
-cli_e2b.register_cli(cli)  # register "e2b" plugin
-
-# register additional plugins
-for entry_point in iter_entry_points(group="dhis2.plugin", name=None):
-    entry_point.load()(cli)  # check for valid function
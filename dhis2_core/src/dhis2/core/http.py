@@ -1,27 +1,297 @@
-import json
+import atexit
+import gzip
 import logging
-import sys
+import random
+import socket
+import threading
+import time
+import zlib
 from copy import deepcopy
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from enum import Enum
-from typing import Dict, Tuple, Union
+from typing import Any, Dict, Iterator, Mapping, Optional, Tuple, Union
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.models import Response  # noqa
 
-from .inventory import HostResolved
+from .inventory import HostResolved, HttpConfig
+from .json_stream import iter_json_array
+from .serializer import dumps_bytes
 
 log = logging.getLogger(__name__)
 
+_sessions: Dict[str, requests.Session] = {}
+_sessions_lock = threading.Lock()
+
+_rate_limiters: Dict[str, "TokenBucket"] = {}
+_rate_limiters_lock = threading.Lock()
+
+
+class HttpError(Exception):
+    def __init__(self, message: str, status_code: Optional[int], url: str, text: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.url = url
+        self.text = text
+
+    def __reduce__(self):
+        # the default only passes self.args (the message) to __init__, which breaks unpickling
+        return (self.__class__, (self.args[0], self.status_code, self.url, self.text))
+
+
+class HttpClientError(HttpError):
+    pass
+
+
+class HttpAuthError(HttpClientError):
+    pass
+
+
+class HttpNotFoundError(HttpClientError):
+    pass
+
+
+class HttpRateLimitError(HttpClientError):
+    pass
+
+
+class HttpServerError(HttpError):
+    pass
+
+
+# no (complete) response was received, like connection errors and timeouts, status_code is None
+class HttpConnectionError(HttpError):
+    pass
+
+
+def get_http_error(status_code: int) -> type:
+    if status_code in [401, 403]:
+        return HttpAuthError
+    elif 404 == status_code:
+        return HttpNotFoundError
+    elif 429 == status_code:
+        return HttpRateLimitError
+    elif status_code >= 500:
+        return HttpServerError
+
+    return HttpClientError
+
+
+class TokenBucket:
+    """ Allows `rate` acquisitions per second on average, with bursts of up to `capacity` """
+
+    def __init__(self, rate: float, capacity: int = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self) -> float:
+        # takes a token (possibly borrowing from the future), returns the number of seconds to wait
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def acquire(self) -> None:
+        wait = self.reserve()
+
+        if wait > 0:
+            time.sleep(wait)
+
+
+def get_rate_limiter(host: HostResolved) -> Optional[TokenBucket]:
+    if not host.http.rateLimit:
+        return None
+
+    with _rate_limiters_lock:
+        if host.key not in _rate_limiters:
+            _rate_limiters[host.key] = TokenBucket(host.http.rateLimit, host.http.rateLimitBurst)
+
+        return _rate_limiters[host.key]
+
+
+def should_retry(config: HttpConfig, method: str, status_code: int, attempt: int) -> bool:
+    if attempt >= config.retries:
+        return False
+
+    if "GET" != method:
+        return status_code in [429, 503]  # the request was not processed, safe to send again
+
+    return status_code in config.retryStatus
+
+
+def get_backoff(config: HttpConfig, attempt: int, headers: Mapping[str, str] = {}) -> float:
+    retry_after = headers.get("Retry-After")
+
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(retry_after) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                delay = None
+
+        if delay is not None:
+            return min(max(delay, 0.0), config.backoffMax)
+
+    # exponential backoff with full jitter
+    return random.uniform(0, min(config.backoffMax, config.backoffFactor * 2 ** attempt))
+
+
+# one pooled session per inventory host, so connections are reused across requests and plugins
+def get_session(host: HostResolved) -> requests.Session:
+    with _sessions_lock:
+        session = _sessions.get(host.key)
+
+        if session:
+            return session
+
+        log.debug(
+            f"Creating session for '{host.key}' with pool size "
+            f"{host.http.poolConnections}/{host.http.poolMaxSize} and keep-alive={host.http.keepAlive}"
+        )
+
+        adapter = HTTPAdapter(
+            pool_connections=host.http.poolConnections,
+            pool_maxsize=host.http.poolMaxSize,
+        )
+
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+        if not host.http.keepAlive:
+            session.headers["Connection"] = "close"
+
+        _sessions[host.key] = session
+
+        return session
+
+
+@atexit.register
+def close_sessions():
+    with _sessions_lock:
+        for session in _sessions.values():
+            session.close()
+
+        _sessions.clear()
+
+
+def compress(data: bytes, encoding: str, level: int = 6) -> bytes:
+    if "gzip" == encoding:
+        return gzip.compress(data, compresslevel=level)
+    elif "deflate" == encoding:
+        return zlib.compress(data, level)  # zlib wrapped, as http "deflate" is specified
+
+    raise ValueError(f"Unsupported content encoding '{encoding}'")
+
 
 class MediaFormat(str, Enum):
     json = "application/json"
     text = "text/plain"
 
 
-class BaseHttpRequest:
-    def __init__(self, host: HostResolved, format: Union[MediaFormat, str] = MediaFormat.json):
+class HttpRequestMixin:
+    """ Request building and error handling shared by the sync and async clients """
+
+    host: HostResolved
+    format: Union[MediaFormat, str]
+
+    def _get_error(self, status_code: int, url: str, text: str) -> HttpError:
+        if status_code in [401, 403]:
+            message = f"Invalid login credentials for '{self.host.key}'"
+        elif 404 == status_code:
+            message = f"Invalid url '{url}', please check 'baseUrl' for '{self.host.key}'"
+        else:
+            message = f"Unhandled status code {status_code}={text}"
+
+        log.error(message)
+
+        return get_http_error(status_code)(message, status_code, url, text)
+
+    def _get_connection_error(self, method: str, url: str, error: Exception) -> HttpConnectionError:
+        message = f"{method} request '{url}' failed: {error}"
+        log.error(message)
+
+        return HttpConnectionError(message, None, url)
+
+    def _get_auth(self) -> Union[Tuple[str], None]:
+        if "http-basic" == self.host.auth.type:
+            return (self.host.auth.username, self.host.auth.password)
+
+        return None
+
+    def _get_headers(self, headers: Dict[str, str] = {}) -> Dict[str, str]:
+        headers = deepcopy(headers)
+
+        if isinstance(self.format, MediaFormat):
+            headers["Content-Type"] = self.format.value
+            headers["Accept"] = self.format.value
+        else:
+            headers["Content-Type"] = self.format
+            headers["Accept"] = self.format
+
+        headers["X-Requested-With"] = "XMLHttpRequest"
+
+        if self.host.http.acceptEncoding:
+            headers["Accept-Encoding"] = self.host.http.acceptEncoding
+
+        headers.update(self.host.headers)
+
+        return headers
+
+    def _get_params(self, params={}) -> Dict[str, str]:
+        params = deepcopy(params)
+        params.update(self.host.params)
+
+        return params
+
+    def _get_url(self, path="") -> str:
+        return f"{self.host.baseUrl}/{path}"
+
+    def _get_body(self, data: Union[str, bytes], headers: Dict[str, str]) -> Union[str, bytes]:
+        """ Compresses the body if enabled for the host, also sets Content-Encoding in headers """
+        config = self.host.http
+
+        if not config.compression:
+            return data
+
+        body = data.encode("utf-8") if isinstance(data, str) else data
+
+        if len(body) < config.compressionMinSize:
+            return data
+
+        compressed = compress(body, config.compression, config.compressionLevel)
+        headers["Content-Encoding"] = config.compression
+
+        log.debug(f"Compressed request body with {config.compression} from {len(body)} to {len(compressed)} bytes")
+
+        return compressed
+
+
+class BaseHttpRequest(HttpRequestMixin):
+    def __init__(
+        self,
+        host: HostResolved,
+        format: Union[MediaFormat, str] = MediaFormat.json,
+        timeout: Optional[float] = None,
+        total_timeout: Optional[float] = None,
+    ):
         self.host = host
         self.format = format
+        self.timeout = timeout or host.http.timeout
+        # wall-clock limit per call including retries and the body, timeout is per socket operation
+        self.total_timeout = total_timeout
+        self.session = get_session(host)
+        self.rate_limiter = get_rate_limiter(host)
 
     def get(
         self,
@@ -36,7 +306,8 @@ class BaseHttpRequest:
 
         log.info(f"Starting GET request '{url}' with params='{params}'")
 
-        response = requests.get(
+        response = self._request(
+            "GET",
             url=url,
             headers=headers,
             params=params,
@@ -57,6 +328,81 @@ class BaseHttpRequest:
 
         return data
 
+    def get_stream(
+        self,
+        path,
+        key,
+        params={},
+        headers={},
+        chunk_size=65536,
+    ) -> Iterator[Any]:
+        """
+        Like get, but decodes the response while downloading, yields the elements of `key`. The
+        connection stays open until the generator is exhausted, a consumer that is slow between
+        items risks the server closing the idle connection, which fails the read and isn't retried.
+        """
+        url = self._get_url(path)
+        headers = self._get_headers(headers)
+        auth = self._get_auth()
+        params = self._get_params(params)
+
+        log.info(f"Starting streaming GET request '{url}' with params='{params}'")
+
+        response = self._request(
+            "GET",
+            url=url,
+            headers=headers,
+            params=params,
+            auth=auth,
+            stream=True,
+        )
+
+        try:
+            if not response.ok:
+                return self._handle_errors(response)
+
+            count = 0
+
+            try:
+                for item in iter_json_array(response.iter_content(chunk_size), key):
+                    count += 1
+                    yield item
+            except requests.RequestException as e:  # the connection broke while reading
+                raise self._get_connection_error("GET", url, e) from e
+
+            log.info(
+                f"Finished streaming GET request '{response.request.url}' with status code "
+                f"'{response.status_code}' and {count} items"
+            )
+        finally:
+            response.close()
+
+    def get_paged(
+        self,
+        path,
+        key,
+        params={},
+        headers={},
+        page_size=1000,
+    ) -> Iterator[Any]:
+        page = 1
+
+        while True:
+            page_params = deepcopy(params)
+            page_params.update({"paging": True, "page": page, "pageSize": page_size})
+
+            data = self.get(path, params=page_params, headers=headers)
+            items = data.get(key, [])
+
+            yield from items
+
+            pager = data.get("pager", {})
+
+            if len(items) < page_size or page >= pager.get("pageCount", page + 1):
+                break
+
+            page += 1
+
     def post(
         self,
         path,
@@ -69,20 +415,22 @@ class BaseHttpRequest:
         auth = self._get_auth()
         params = self._get_params(params)
 
-        if not isinstance(data, str):
-            data = json.dumps(data)
+        if not isinstance(data, (str, bytes)):
+            data = dumps_bytes(data)
 
         if log.isEnabledFor(logging.DEBUG):
-            log.info(f"Starting POST request '{url}' with params='{params}' and data={data}")
+            text = data.decode("utf-8") if isinstance(data, bytes) else data
+            log.info(f"Starting POST request '{url}' with params='{params}' and data={text}")
         else:
             log.info(f"Starting POST request '{url} with params={params}'")
 
-        response = requests.post(
+        response = self._request(
+            "POST",
             url=url,
             headers=headers,
             params=params,
             auth=auth,
-            data=data,
+            data=self._get_body(data, headers),
         )
 
         log.info(f"Finished POST request '{response.request.url}'' with status code '{response.status_code}''")
@@ -97,43 +445,84 @@ class BaseHttpRequest:
 
         return data
 
-    def _handle_errors(self, response: Response):
-        if 401 == response.status_code:
-            log.error(f"Invalid login credentials for '{self.host.key}''")
-        if 404 == response.status_code:
-            log.error(f"Invalid url '{response.request.url}', please check 'baseUrl' for '{self.host.key}'")
-        else:
-            log.error(f"Unhandled status code {response.status_code}={response.text}")
-
-        sys.exit(-1)
-
-    def _get_auth(self) -> Union[Tuple[str], None]:
-        if "http-basic" == self.host.auth.type:
-            return (self.host.auth.username, self.host.auth.password)
+    def _request(self, method: str, url: str, **kwargs) -> Response:
+        config = self.host.http
+        attempt = 0
+        deadline = time.monotonic() + self.total_timeout if self.total_timeout else None
+
+        while True:
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+
+            timeout = self.timeout
+
+            if deadline:
+                remaining = deadline - time.monotonic()
+
+                if remaining <= 0:
+                    raise self._get_connection_error(method, url, f"exceeded {self.total_timeout}s")
+
+                timeout = min(timeout, remaining) if timeout else remaining
+
+            try:
+                if deadline and not kwargs.get("stream"):
+                    response = self.session.request(method, url, timeout=timeout, stream=True, **kwargs)
+                    self._read_until(response, deadline)
+                else:
+                    response = self.session.request(method, url, timeout=timeout, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if "GET" != method or attempt >= config.retries:
+                    raise self._get_connection_error(method, url, e) from e
+
+                delay = get_backoff(config, attempt)
+                log.warning(f"{method} request '{url}' failed ({e}), retrying in {delay:.1f}s")
+            except requests.RequestException as e:  # invalid url, too many redirects, broken body, ..
+                raise self._get_connection_error(method, url, e) from e
+            else:
+                if response.ok or not should_retry(config, method, response.status_code, attempt):
+                    return response
+
+                delay = get_backoff(config, attempt, response.headers)
+                log.warning(
+                    f"{method} request '{response.request.url}' returned status code {response.status_code}, "
+                    f"retrying in {delay:.1f}s ({attempt + 1}/{config.retries})"
+                )
+
+                response.close()  # release the connection, the body is never read with stream=True
+
+            if deadline and time.monotonic() + delay >= deadline:
+                raise self._get_connection_error(method, url, f"exceeded {self.total_timeout}s")
+
+            time.sleep(delay)
+            attempt += 1
+
+    def _read_until(self, response: Response, deadline: float) -> None:
+        # reading the body blocks until all of it arrived, a server that keeps sending bytes slowly
+        # is cut off by shutting down the socket once the deadline passes
+        def cut_off():
+            try:
+                # shutdown acts on the connection, ending the read blocked on the original fd
+                with socket.fromfd(response.raw.fileno(), socket.AF_INET, socket.SOCK_STREAM) as sock:
+                    sock.shutdown(socket.SHUT_RDWR)
+            except (OSError, ValueError):  # already closed
+                pass
+
+        watchdog = threading.Timer(max(deadline - time.monotonic(), 0), cut_off)
+        watchdog.daemon = True
+        watchdog.start()
+
+        try:
+            response.content
+        except requests.RequestException as e:
+            if time.monotonic() < deadline:
+                raise
+
+            raise requests.Timeout(f"Reading response from '{response.url}' exceeded {self.total_timeout}s") from e
+        finally:
+            watchdog.cancel()
+
+        if time.monotonic() >= deadline:  # the body may have been cut short without an error
+            raise requests.Timeout(f"Reading response from '{response.url}' exceeded {self.total_timeout}s")
 
-        return None
-
-    def _get_headers(self, headers: Dict[str, str] = {}) -> Dict[str, str]:
-        headers = deepcopy(headers)
-
-        if isinstance(self.format, MediaFormat):
-            headers["Content-Type"] = self.format.value
-            headers["Accept"] = self.format.value
-        else:
-            headers["Content-Type"] = self.format
-            headers["Accept"] = self.format
-
-        headers["X-Requested-With"] = "XMLHttpRequest"
-
-        headers.update(self.host.headers)
-
-        return headers
-
-    def _get_params(self, params={}) -> Dict[str, str]:
-        params = deepcopy(params)
-        params.update(self.host.params)
-
-        return params
-
-    def _get_url(self, path="") -> str:
-        return f"{self.host.baseUrl}/{path}"
+    def _handle_errors(self, response: Response):
+        raise self._get_error(response.status_code, response.request.url, response.text)
@@ -0,0 +1,192 @@
+import asyncio
+import logging
+import threading
+import weakref
+from typing import Any, Awaitable, Dict, Iterable, List, Optional, TypeVar, Union
+
+from .http import HttpRequestMixin, MediaFormat, get_backoff, get_rate_limiter, should_retry
+from .inventory import HostResolved
+from .serializer import dumps_bytes
+
+try:
+    import aiohttp
+except ImportError:  # optional, install with the 'async' extra
+    aiohttp = None
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# asyncio primitives are bound to a loop, so the per host limits are kept per loop
+_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_semaphore(host: HostResolved) -> asyncio.Semaphore:
+    semaphores = _semaphores.setdefault(asyncio.get_running_loop(), {})
+
+    if host.key not in semaphores:
+        semaphores[host.key] = asyncio.Semaphore(host.http.maxConcurrency)
+
+    return semaphores[host.key]
+
+
+class AsyncHttpRequest(HttpRequestMixin):
+    def __init__(
+        self,
+        host: HostResolved,
+        format: Union[MediaFormat, str] = MediaFormat.json,
+        timeout: Optional[float] = None,
+    ):
+        if aiohttp is None:
+            raise ImportError("AsyncHttpRequest requires aiohttp, install with 'pip install dhis2[async]'")
+
+        self.host = host
+        self.format = format
+        self.timeout = timeout or host.http.timeout
+        self.rate_limiter = get_rate_limiter(host)
+        self._session: Optional["aiohttp.ClientSession"] = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    async def close(self):
+        if self._session:
+            await self._session.close()
+            self._session = None
+
+    async def get(
+        self,
+        path,
+        params={},
+        headers={},
+    ):
+        url = self._get_url(path)
+        params = self._get_params(params)
+
+        log.info(f"Starting GET request '{url}' with params='{params}'")
+
+        return await self._request("GET", url, params=params, headers=self._get_headers(headers))
+
+    async def post(
+        self,
+        path,
+        data,
+        params={},
+        headers={},
+    ):
+        url = self._get_url(path)
+        params = self._get_params(params)
+
+        if not isinstance(data, (str, bytes)):
+            data = dumps_bytes(data)
+
+        log.info(f"Starting POST request '{url} with params={params}'")
+
+        headers = self._get_headers(headers)
+        if self.host.http.compression:  # large bodies take a while, keep the loop responsive
+            data = await asyncio.get_running_loop().run_in_executor(None, self._get_body, data, headers)
+
+        return await self._request("POST", url, params=params, headers=headers, data=data)
+
+    def _get_session(self) -> "aiohttp.ClientSession":
+        if self._session is None:
+            auth = self._get_auth()
+
+            self._session = aiohttp.ClientSession(
+                auth=aiohttp.BasicAuth(*auth) if auth else None,
+                connector=aiohttp.TCPConnector(limit=self.host.http.maxConcurrency),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Connection": "close"} if not self.host.http.keepAlive else None,
+            )
+
+        return self._session
+
+    async def _request(self, method: str, url: str, params: Dict[str, Any] = {}, **kwargs) -> Any:
+        config = self.host.http
+        params = {key: str(value) for key, value in params.items()}  # aiohttp only accepts str/int/float
+        attempt = 0
+
+        while True:
+            if self.rate_limiter:
+                await asyncio.sleep(self.rate_limiter.reserve())
+
+            try:
+                async with get_semaphore(self.host):
+                    async with self._get_session().request(method, url, params=params, **kwargs) as response:
+                        log.info(f"Finished {method} request '{response.url}' with status code '{response.status}'")
+
+                        if 200 <= response.status < 300:
+                            if MediaFormat.json == self.format:
+                                return await response.json(content_type=None)
+
+                            return await response.text()
+
+                        text = await response.text()
+                        headers = response.headers
+                        status = response.status
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if "GET" != method or attempt >= config.retries:
+                    raise self._get_connection_error(method, url, repr(e)) from e
+
+                delay = get_backoff(config, attempt)
+                log.warning(f"{method} request '{url}' failed ({e!r}), retrying in {delay:.1f}s")
+            except aiohttp.ClientError as e:  # invalid url, too many redirects, broken body, ..
+                raise self._get_connection_error(method, url, repr(e)) from e
+            else:
+                if not should_retry(config, method, status, attempt):
+                    raise self._get_error(status, url, text)
+
+                delay = get_backoff(config, attempt, headers)
+                log.warning(
+                    f"{method} request '{url}' returned status code {status}, "
+                    f"retrying in {delay:.1f}s ({attempt + 1}/{config.retries})"
+                )
+
+            await asyncio.sleep(delay)
+            attempt += 1
+
+
+def run(aw: Awaitable[T]) -> T:
+    """ Runs a coroutine from synchronous code, also when a loop is already running """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(aw)
+
+    result: Dict[str, Any] = {}
+
+    def target():
+        try:
+            result["value"] = asyncio.run(aw)
+        except BaseException as e:  # noqa
+            result["error"] = e
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    thread.join()
+
+    if "error" in result:
+        raise result["error"]
+
+    return result["value"]
+
+
+def get_many(
+    host: HostResolved,
+    paths: Iterable[str],
+    params={},
+    headers={},
+    format: Union[MediaFormat, str] = MediaFormat.json,
+) -> List[Any]:
+    """ Fetches all paths concurrently (up to http.maxConcurrency), results keep their order """
+
+    async def fetch_all():
+        async with AsyncHttpRequest(host, format) as req:
+            return await asyncio.gather(*(req.get(path, params, headers) for path in paths))
+
+    return run(fetch_all())
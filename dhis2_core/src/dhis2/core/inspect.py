@@ -1,29 +1,83 @@
 import logging
-from typing import List
+from typing import Any, Dict, List, Optional
 
-from .http import BaseHttpRequest
+from pydantic import ValidationError
+
+from .http import BaseHttpRequest, HttpConnectionError, HttpError
 from .inventory import HostResolved
 from .metadata.models.system_info import SystemInfo
+from .utils import bounded_map
 
 log = logging.getLogger(__name__)
 
 
-def inspect_host(host: HostResolved):
-    req = BaseHttpRequest(host)
+def inspect_host(host: HostResolved, timeout: float = 10.0) -> Optional[SystemInfo]:
+    # a single attempt limited to `timeout` seconds in total, so a dead host cannot stall the report
+    host = host.copy(update={"http": host.http.copy(update={"retries": 0})})
+
+    req = BaseHttpRequest(host, timeout=timeout, total_timeout=timeout)
     data = req.get("api/system/info")
 
     if not data:
-        return
+        return None
 
     info = SystemInfo(**data)
 
     log.info(info)
 
+    return info
+
+
+def build_report(host: HostResolved, info: Optional[SystemInfo] = None, error: Optional[str] = None) -> Dict[str, Any]:
+    report = {
+        "host": host.key,
+        "baseUrl": host.baseUrl,
+        "version": None,
+        "revision": None,
+        "lastAnalyticsTableRuntime": None,
+        "cpuCores": None,
+        "databaseVersion": None,
+        "error": error,
+    }
+
+    if info:
+        report["version"] = info.version
+        report["revision"] = info.revision
+        report["lastAnalyticsTableRuntime"] = info.lastAnalyticsTableRuntime
+        report["cpuCores"] = info.cpuCores
+
+        if info.databaseInfo:
+            report["databaseVersion"] = info.databaseInfo.databaseVersion
+
+    return report
+
+
+def inspect(
+    hosts: List[HostResolved] = [],
+    concurrency: int = 16,
+    timeout: float = 10.0,
+) -> List[Dict[str, Any]]:
+    dhis2_hosts = []
 
-def inspect(hosts: List[HostResolved] = []):
     for host in hosts:
         if "dhis2" != host.type:
             log.warning(f"Only 'dhis2' type is supported, ignoring host '{host.key}' with type '{host.type}'")
             continue
 
-        inspect_host(host)
+        dhis2_hosts.append(host)
+
+    def fn(host: HostResolved):
+        try:
+            return build_report(host, inspect_host(host, timeout))
+        except ValidationError as e:
+            log.error(f"Invalid system info from host '{host.key}': {e.json(indent=None)}")
+            return build_report(host, error="Invalid system info")
+        except ValueError as e:  # a body that isn't json, like a login page (json errors are plain ValueErrors)
+            log.error(f"Invalid response from host '{host.key}': {e}")
+            return build_report(host, error="Invalid response")
+        except HttpConnectionError as e:  # the reason is logged by BaseHttpRequest
+            return build_report(host, error=str(e))
+        except HttpError as e:
+            return build_report(host, error=f"Request failed with status code {e.status_code}")
+
+    return list(bounded_map(fn, dhis2_hosts, concurrency))
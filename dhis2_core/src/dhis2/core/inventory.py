@@ -1,13 +1,21 @@
+import hashlib
 import json
 import logging
+import os
 import sys
 from enum import Enum
-from typing import Any, Dict, List, Literal, Mapping, Optional, Union
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Literal, Mapping, Optional, Tuple, Union
 from urllib.parse import urlparse
 
-from pydantic import BaseModel, Field, ValidationError
+from pydantic import VERSION as PYDANTIC_VERSION
+from pydantic import BaseModel, Field, PrivateAttr, ValidationError
 from yaml import load as load
 
+from .cache import default_cache_dir
+from .serializer import dumps
+
 try:
     from yaml import CLoader as Loader
 except ImportError:
@@ -15,6 +23,9 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+# bump when the inventory models change, invalidates all compiled inventories
+INVENTORY_CACHE_VERSION = f"6-{PYDANTIC_VERSION}"
+
 
 # officially supported types
 class HostType(str, Enum):
@@ -34,11 +45,30 @@ class NoopAuthtype(BaseModel):
     type: Literal["no-op"] = "no-op"
 
 
+class HttpConfig(BaseModel):
+    poolConnections: int = 10
+    poolMaxSize: int = 10
+    keepAlive: bool = True
+    timeout: Optional[float] = None  # seconds
+    retries: int = Field(3, ge=0)
+    retryStatus: List[int] = [429, 500, 502, 503, 504]  # POST requests are only retried on 429/503
+    backoffFactor: float = Field(0.5, ge=0)  # seconds, doubled for every retry (full jitter)
+    backoffMax: float = Field(120.0, ge=0)  # seconds, also caps Retry-After
+    rateLimit: Optional[float] = Field(None, gt=0)  # requests per second, shared by all requests to the host
+    rateLimitBurst: int = Field(1, ge=1)
+    maxConcurrency: int = Field(100, gt=0)  # in-flight requests per host for the async client
+    acceptEncoding: Optional[str] = "gzip, deflate"  # response compression, "identity" disables it
+    compression: Optional[Literal["gzip", "deflate"]] = None  # request body compression (POST)
+    compressionLevel: int = Field(6, ge=1, le=9)
+    compressionMinSize: int = Field(1024, ge=0)  # bytes, smaller bodies are sent as-is
+
+
 class Host(BaseModel):
     type: Union[HostType, str] = HostType.dhis2
     baseUrl: str
     headers: Mapping[str, str] = {}
     params: Mapping[str, str] = {}
+    http: HttpConfig = HttpConfig()
     auth: Optional[Dict[str, Union[NoopAuthtype, BasicAuthtype]]] = {"default": NoopAuthtype()}
 
     class Config:
@@ -51,6 +81,7 @@ class HostResolved(BaseModel):
     baseUrl: str
     headers: Mapping[str, str] = {}
     params: Mapping[str, str] = {}
+    http: HttpConfig = HttpConfig()
     auth: Union[NoopAuthtype, BasicAuthtype]
 
 
@@ -58,6 +89,32 @@ class Inventory(BaseModel):
     hosts: Dict[str, Host]
     groups: Dict[str, List[str]] = Field(default_factory=dict)
 
+    # built on first use, hosts/groups should not be changed after that
+    _groups_expanded: Optional[Dict[str, Tuple[str, ...]]] = PrivateAttr(None)
+    _resolved: Dict[str, List["HostResolved"]] = PrivateAttr(default_factory=dict)
+
+    def get_group_hosts(self, id: str) -> Tuple[str, ...]:
+        if self._groups_expanded is None:
+            self._groups_expanded = {gid: self._expand_group(gid, []) for gid in self.groups}
+
+        return self._groups_expanded.get(id, ())
+
+    def _expand_group(self, id: str, path: List[str]) -> Tuple[str, ...]:
+        if id in path:
+            log.error(f"Cycle found in inventory groups: {' -> '.join(path + [id])}")
+            sys.exit(-1)
+
+        hosts: Dict[str, None] = {}  # ordered set
+
+        for gid in self.groups[id]:
+            if gid in self.hosts:
+                hosts[gid] = None
+
+            if gid in self.groups:  # nested group
+                hosts.update(dict.fromkeys(self._expand_group(gid, path + [id])))
+
+        return tuple(hosts)
+
     def get_many_by_id(self, ids) -> Dict[str, Host]:
         if not isinstance(ids, (list, set, tuple)):
             ids = [ids]
@@ -69,10 +126,8 @@ class Inventory(BaseModel):
                 hosts[id] = self.hosts[id]
 
         for id in ids:
-            if id in self.groups:
-                for gid in self.groups[id]:
-                    if gid in self.hosts:
-                        hosts[gid] = self.hosts.get(gid)
+            for gid in self.get_group_hosts(id):
+                hosts[gid] = self.hosts[gid]
 
         return hosts
 
@@ -80,14 +135,14 @@ class Inventory(BaseModel):
         hosts = self.get_many_by_id(id)
 
         if not hosts:
-            log.info("Zero hosts found for id '{id}', expected one result")
+            log.info(f"Zero hosts found for id '{id}', expected one result")
             sys.exit(-1)
 
         if len(hosts) > 1:
-            log.info("Many hosts found for id '{id}', expected one result")
+            log.info(f"Many hosts found for id '{id}', expected one result")
             sys.exit(-1)
 
-        return hosts[0]
+        return next(iter(hosts.values()))
 
 
 def _process_inventory_data(inventory: Dict[str, Any]) -> None:
@@ -111,18 +166,175 @@ def _process_inventory_data(inventory: Dict[str, Any]) -> None:
             del value["password"]
 
 
-def parse_file(filename: str) -> Inventory:
+def _parse_content(filename: str, content: bytes) -> Inventory:
     data: Dict[str, Any] = {}
 
-    with open(filename) as f:
-        if filename.endswith(".yml"):
-            data = load(f, Loader=Loader)
-        elif filename.endswith(".json"):
-            data = json.load(f)
+    if filename.endswith(".yml"):
+        data = load(content, Loader=Loader)
+    elif filename.endswith(".json"):
+        data = json.loads(content)
 
     return parse_obj(data)
 
 
+def parse_file(filename: str) -> Inventory:
+    with open(filename, "rb") as f:
+        return _parse_content(filename, f.read())
+
+
+def has_credentials(inventory: Inventory) -> bool:
+    """ True if any host may carry secrets: auth, headers, params or userinfo in baseUrl """
+    for host in inventory.hosts.values():
+        if any(not isinstance(auth, NoopAuthtype) for auth in (host.auth or {}).values()):
+            return True
+
+        # tokens are also passed as custom headers (X-API-Key, Cookie, ..) or query params
+        if host.headers or host.params:
+            return True
+
+        if "@" in urlparse(host.baseUrl).netloc:
+            return True
+
+    return False
+
+
+def _is_private(st: os.stat_result) -> bool:
+    # owned by the current user, and not writable by group or others
+    if hasattr(os, "getuid") and st.st_uid != os.getuid():
+        return False
+
+    return not st.st_mode & 0o022
+
+
+def _read_cache_entry(cache_fp: Path) -> Dict[str, Any]:
+    try:
+        if not _is_private(os.stat(cache_fp.parent)):
+            log.warning(f"Ignoring inventory cache, '{cache_fp.parent}' is not private to the current user")
+            return {}
+
+        with open(os.open(cache_fp, os.O_RDONLY | getattr(os, "O_NOFOLLOW", 0)), "rb") as f:
+            if not _is_private(os.fstat(f.fileno())):
+                log.warning(f"Ignoring inventory cache, '{cache_fp}' is not private to the current user")
+                return {}
+
+            entry = json.loads(f.read())
+    except (OSError, ValueError):
+        return {}
+
+    return entry if isinstance(entry, dict) else {}
+
+
+def _construct_host(data: Dict[str, Any]) -> Host:
+    auth = data.get("auth")
+
+    if auth is not None:
+        auth = {
+            id: BasicAuthtype.construct(**value) if "http-basic" == value["type"] else NoopAuthtype.construct(**value)
+            for id, value in auth.items()
+        }
+
+    type = data["type"]
+
+    if type in [t.value for t in HostType]:
+        type = HostType(type)
+
+    return Host.construct(**{**data, "type": type, "http": HttpConfig.construct(**data["http"]), "auth": auth})
+
+
+def _construct_inventory(data: Dict[str, Any]) -> Optional[Inventory]:
+    """ Rebuild a cached Inventory.dict() without validating it again, None if it is malformed """
+    try:
+        return Inventory.construct(
+            hosts={id: _construct_host(host) for id, host in data["hosts"].items()},
+            groups={id: list(hosts) for id, hosts in data["groups"].items()},
+        )
+    except (AttributeError, KeyError, TypeError):
+        return None
+
+
+def parse_file_cached(
+    filename: str,
+    cache_dir: Optional[Union[Path, str]] = None,
+    credentials: bool = False,
+) -> Inventory:
+    """
+    Like parse_file, keeps the validated inventory as json in a cache keyed by path, mtime and hash.
+    Inventories with credentials are only cached if `credentials` is set, and entries are ignored
+    unless the cache directory and file are owned by, and only writable by, the current user.
+    """
+    fp = Path(filename).resolve()
+    cache_dir = Path(cache_dir) if cache_dir else default_cache_dir() / "inventory"
+    cache_fp = cache_dir / f"{hashlib.sha256(str(fp).encode('utf-8')).hexdigest()}.json"
+    stat = fp.stat()
+    entry = _read_cache_entry(cache_fp)
+    content: Optional[bytes] = None
+
+    if entry.get("version") != INVENTORY_CACHE_VERSION or entry.get("path") != str(fp):
+        entry = {}
+
+    if entry.get("credentials") and not credentials:
+        entry = {}
+
+    if entry and (entry.get("mtime") != stat.st_mtime_ns or entry.get("size") != stat.st_size):
+        with open(fp, "rb") as f:
+            content = f.read()
+
+        if entry.get("hash") != hashlib.sha256(content).hexdigest():
+            entry = {}
+
+    inventory = _construct_inventory(entry["inventory"]) if "inventory" in entry else None
+
+    if inventory and content is None:
+        return inventory
+
+    if not inventory:
+        if content is None:
+            with open(fp, "rb") as f:
+                content = f.read()
+
+        inventory = _parse_content(filename, content)
+
+    has_secrets = has_credentials(inventory)
+
+    if has_secrets and not credentials:
+        log.debug(f"Not caching inventory '{fp}' since it contains credentials")
+
+        try:
+            cache_fp.unlink()  # don't leave credentials from an earlier opt-in behind
+        except OSError:
+            pass
+
+        return inventory
+
+    entry = {
+        "version": INVENTORY_CACHE_VERSION,
+        "path": str(fp),
+        "mtime": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "hash": hashlib.sha256(content).hexdigest(),
+        "credentials": has_secrets,
+        "inventory": inventory.dict(),
+    }
+
+    try:
+        cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+        if not _is_private(os.stat(cache_dir)):
+            log.warning(f"Not writing inventory cache, '{cache_dir}' is not private to the current user")
+            return inventory
+
+        tmp = cache_fp.with_name(f"{cache_fp.name}.{os.getpid()}.tmp")
+
+        with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w", encoding="utf-8") as f:
+            f.write(dumps(entry))
+
+        os.replace(tmp, cache_fp)
+    except OSError as e:
+        log.warning(f"Unable to write inventory cache '{cache_fp}': {e}")
+
+    return inventory
+
+
 def parse_obj(data: Dict[str, Any]) -> Inventory:
     _process_inventory_data(data)
 
@@ -135,6 +347,7 @@ def parse_obj(data: Dict[str, Any]) -> Inventory:
     return data
 
 
+@lru_cache(maxsize=4096)
 def normalize(id: str) -> str:
     if "://" not in id:
         id = f"http://{id}"
@@ -158,8 +371,10 @@ def normalize(id: str) -> str:
 
 
 def resolve(id: str, inventory: Inventory) -> List[HostResolved]:
-    id = normalize(id)
-    id_parsed = urlparse(id)
+    if id in inventory._resolved:
+        return list(inventory._resolved[id])
+
+    id_parsed = urlparse(normalize(id))
 
     hosts = inventory.get_many_by_id(id_parsed.hostname)
     host_resolved = []
@@ -181,12 +396,15 @@ def resolve(id: str, inventory: Inventory) -> List[HostResolved]:
             baseUrl=value.baseUrl,
             headers=value.headers,
             params=value.params,
+            http=value.http,
             auth=auth,
         )
 
         host_resolved.append(hr)
 
-    return host_resolved
+    inventory._resolved[id] = host_resolved
+
+    return list(host_resolved)
 
 
 def resolve_one(id: str, inventory: Inventory) -> HostResolved:
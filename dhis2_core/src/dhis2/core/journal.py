@@ -0,0 +1,127 @@
+import json
+import logging
+import os
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+from .serializer import dumps
+
+log = logging.getLogger(__name__)
+
+
+class CheckpointJournal:
+    """ Append-only JSONL journal of fetched payloads, used to resume interrupted crawls """
+
+    def __init__(self, path: Union[Path, str], header: Dict[str, Any], resume: bool = False):
+        self.path = Path(path)
+        self.header = header
+        self.entries: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+        if resume and self.path.is_file():
+            end = self._load()
+
+            if end < self.path.stat().st_size:
+                # drop the partial entry of an interrupted write, so appends start on a new line
+                log.warning(f"Truncating incomplete entries at the end of checkpoint '{self.path}'")
+                os.truncate(self.path, end)
+
+            self._fp = open(self.path, "a", encoding="utf-8")
+        else:
+            if resume:
+                log.warning(f"Checkpoint '{self.path}' not found, starting from the beginning")
+
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._fp = open(self.path, "w", encoding="utf-8")
+            self._write({"header": header})
+
+    def _load(self) -> int:
+        """ Reads the entries, returns the offset after the last valid line """
+        pos = end = 0
+
+        with open(self.path, "rb") as f:
+            for idx, line in enumerate(f):
+                pos += len(line)
+                entry = None
+
+                if line.endswith(b"\n"):  # the last line is incomplete if the write was interrupted
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        pass
+
+                if not isinstance(entry, dict):
+                    entry = {}
+
+                if 0 == idx:
+                    if "header" not in entry:
+                        log.error(f"Checkpoint '{self.path}' has an invalid header")
+                        sys.exit(-1)
+
+                    if entry["header"] != self.header:
+                        log.error(f"Checkpoint '{self.path}' was written by a different job: {entry['header']}")
+                        sys.exit(-1)
+                elif "id" not in entry or "data" not in entry:
+                    log.warning(f"Ignoring invalid line {idx + 1} in checkpoint '{self.path}'")
+                    continue
+                else:
+                    self.entries[entry["id"]] = entry["data"]
+
+                end = pos
+
+        if not end:
+            log.error(f"Checkpoint '{self.path}' is empty, remove it or start without --resume")
+            sys.exit(-1)
+
+        log.info(f"Resuming from checkpoint '{self.path}' with {len(self.entries)} entries")
+
+        return end
+
+    def _write(self, entry: Dict[str, Any]):
+        with self._lock:
+            self._fp.write(dumps(entry) + "\n")
+            self._fp.flush()
+
+    def get(self, id: str) -> Any:
+        return self.entries.get(id)
+
+    def put(self, id: str, data: Any) -> None:
+        self.entries[id] = data
+        self._write({"id": id, "data": data})
+
+    def fetch(self, id: str, fn: Callable[[], Any]) -> Any:
+        data = self.get(id)
+
+        if data is not None:
+            return data
+
+        data = fn()
+        self.put(id, data)
+
+        return data
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def open_journal(
+    path: Optional[Union[Path, str]],
+    header: Dict[str, Any],
+    resume: bool = False,
+) -> Optional[CheckpointJournal]:
+    if not path:
+        if resume:
+            log.error("--resume requires a checkpoint file (--checkpoint)")
+            sys.exit(-1)
+
+        return None
+
+    return CheckpointJournal(path, header, resume)
@@ -0,0 +1,160 @@
+import codecs
+import json
+import re
+from typing import Any, Iterable, Iterator, Optional, Tuple, Union
+
+_decoder = json.JSONDecoder()
+_whitespace = re.compile(r"[ \t\n\r]*")
+
+# drop the consumed part of the buffer once it grows past this many characters
+_COMPACT_SIZE = 1 << 16
+
+_NUMBER_CHARS = frozenset("0123456789+-.eE")
+
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+class _Buffer:
+    """ Rolling text buffer over an iterable of (utf-8) byte or text chunks """
+
+    def __init__(self, chunks: Iterable[Union[bytes, str]]):
+        self.chunks = iter(chunks)
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """ Append the next non-empty chunk, returns False at the end of the input """
+        for chunk in self.chunks:
+            if isinstance(chunk, bytes):
+                chunk = self.decoder.decode(chunk)
+
+            if not chunk:
+                continue
+
+            if self.pos > _COMPACT_SIZE:
+                pos, self.pos = self.pos, 0
+                self.text = self.text[pos:]
+
+            self.text += chunk
+
+            return True
+
+        if not self.eof:
+            self.eof = True
+            self.text += self.decoder.decode(b"", final=True)
+
+        return False
+
+    def peek(self) -> str:
+        """ Next non-whitespace character, or an empty string at the end of the input """
+        while True:
+            self.pos = _whitespace.match(self.text, self.pos).end()
+
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+
+            if not self.fill():
+                return ""
+
+    def expect(self, chars: str) -> str:
+        char = self.peek()
+
+        if not char or char not in chars:
+            raise self.error(f"Expecting one of {list(chars)}")
+
+        self.pos += 1
+
+        return char
+
+    def value(self) -> Any:
+        """ Decode the next complete json value """
+        self.peek()
+
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                # incomplete (or invalid) value, at least double the buffered data before trying
+                # again so large values are not decoded once for every chunk
+                size = len(self.text) - self.pos
+                filled = False
+
+                while len(self.text) - self.pos < 2 * size and self.fill():
+                    filled = True
+
+                if filled:
+                    continue
+
+                raise
+
+            # a number at the end of the buffer (or before "." or "e") can continue in the next one
+            incomplete = _is_number(value) and (end == len(self.text) or self.text[end] in _NUMBER_CHARS)
+
+            if not incomplete or not self.fill():
+                self.pos = end
+                return value
+
+    def error(self, message: str) -> json.JSONDecodeError:
+        return json.JSONDecodeError(message, self.text, self.pos)
+
+
+def _iter_array(buffer: _Buffer) -> Iterator[Any]:
+    buffer.expect("[")
+
+    if "]" == buffer.peek():
+        buffer.pos += 1
+        return
+
+    while True:
+        yield buffer.value()
+
+        if "]" == buffer.expect(",]"):
+            return
+
+
+def _iter_object(buffer: _Buffer) -> Iterator[Tuple[str, _Buffer]]:
+    buffer.expect("{")
+
+    if "}" == buffer.peek():
+        buffer.pos += 1
+        return
+
+    while True:
+        if '"' != buffer.peek():
+            raise buffer.error("Expecting property name enclosed in double quotes")
+
+        key = buffer.value()
+        buffer.expect(":")
+
+        yield key, buffer  # the consumer reads (or skips) the value
+
+        if "}" == buffer.expect(",}"):
+            return
+
+
+def iter_json_array(chunks: Iterable[Union[bytes, str]], key: Optional[str] = None) -> Iterator[Any]:
+    """
+    Incrementally decode a json document and yield the elements of the top-level array `key` one
+    at a time, or of the document itself if no key is given. Other top-level values are decoded
+    and discarded, a missing key yields nothing.
+    """
+    buffer = _Buffer(chunks)
+
+    if key is None:
+        yield from _iter_array(buffer)
+    else:
+        found = False
+
+        for name, _ in _iter_object(buffer):
+            if name == key and not found and "[" == buffer.peek():
+                found = True
+                yield from _iter_array(buffer)
+            else:
+                buffer.value()
+
+    if buffer.peek():
+        raise buffer.error("Extra data")
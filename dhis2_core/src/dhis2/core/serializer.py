@@ -0,0 +1,77 @@
+import json
+import logging
+from typing import IO, Any, Iterator, Optional
+
+try:
+    import orjson
+except ImportError:  # optional, install with the 'fast' extra
+    orjson = None
+
+log = logging.getLogger(__name__)
+
+BACKEND = "orjson" if orjson else "json"
+
+
+def dumps(obj: Any, indent: Optional[int] = None) -> str:
+    """
+    Serialize to a (non-ascii) json string, compact unless `indent` is given. Uses orjson when
+    installed, which only supports an indent of 2, and falls back to json for what it can't encode.
+    """
+    if orjson and indent in [None, 2]:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+        except TypeError:  # e.g. big ints or non-str keys
+            pass
+
+    if indent is None:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    return json.dumps(obj, ensure_ascii=False, indent=indent)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """ Serialize to compact utf-8 encoded json, e.g. for request bodies """
+    if orjson:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _iter_chunks(obj: Any, indent: Optional[int], level: int, depth: int) -> Iterator[str]:
+    if depth <= 0 or not obj or not isinstance(obj, (dict, list, tuple)):
+        value = dumps(obj, indent)
+
+        if indent and level:
+            value = value.replace("\n", "\n" + " " * (indent * level))  # newlines can't occur inside strings
+
+        yield value
+        return
+
+    newline = "\n" + " " * (indent * (level + 1)) if indent else ""
+    separator = ": " if indent else ":"
+    start, end = ("{", "}") if isinstance(obj, dict) else ("[", "]")
+
+    yield start
+
+    for idx, item in enumerate(obj.items() if isinstance(obj, dict) else obj):
+        yield ("," if idx else "") + newline
+
+        if isinstance(obj, dict):
+            yield dumps(str(item[0])) + separator
+            item = item[1]
+
+        yield from _iter_chunks(item, indent, level + 1, depth - 1)
+
+    yield ("\n" + " " * (indent * level) if indent else "") + end
+
+
+def dump(obj: Any, fp: IO[str], indent: Optional[int] = None, depth: int = 2) -> None:
+    """
+    Like dumps, but writes to a text stream. The outer `depth` levels of dicts and lists are written
+    one item at a time, so the output for large collections is never built as a single string.
+    """
+    for chunk in _iter_chunks(obj, indent, 0, depth):
+        fp.write(chunk)
@@ -0,0 +1,54 @@
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+from urllib.parse import quote
+
+log = logging.getLogger(__name__)
+
+
+def default_state_dir() -> Path:
+    if "DHIS2_STATE_DIR" in os.environ:
+        return Path(os.environ["DHIS2_STATE_DIR"])
+
+    return Path(os.environ.get("XDG_STATE_HOME", Path.home() / ".local" / "state")) / "dhis2"
+
+
+def _get_state_file(job_type: str, job_id: str, state_dir: Optional[Union[Path, str]] = None) -> Path:
+    # one directory per job type, and percent-encoded ids so different ids never share a file
+    state_dir = Path(state_dir) if state_dir else default_state_dir()
+    return state_dir / job_type / f"{quote(job_id, safe='')}.json"
+
+
+def load_state(job_type: str, job_id: str, state_dir: Optional[Union[Path, str]] = None) -> Dict[str, Any]:
+    fp = _get_state_file(job_type, job_id, state_dir)
+
+    if not fp.is_file():
+        return {}
+
+    try:
+        with open(fp, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        log.warning(f"Ignoring invalid state file '{fp}': {e}")
+        return {}
+
+
+def save_state(
+    job_type: str,
+    job_id: str,
+    state: Dict[str, Any],
+    state_dir: Optional[Union[Path, str]] = None,
+) -> None:
+    fp = _get_state_file(job_type, job_id, state_dir)
+    fp.parent.mkdir(parents=True, exist_ok=True)
+
+    tmp = fp.with_name(f"{fp.name}.{os.getpid()}.tmp")
+
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=2)
+
+    os.replace(tmp, fp)
+
+    log.info(f"Saved state for {job_type} job '{job_id}' to '{fp}'")
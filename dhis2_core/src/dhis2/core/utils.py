@@ -1,10 +1,14 @@
 import json
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Callable, Deque, Dict, Iterable, Iterator, List, Optional, TypeVar
 
 from yaml import load as load
 
+from .cache import ResponseCache
 from .http import BaseHttpRequest
 from .inventory import HostResolved
 from .metadata.models import Schema, Schemas
@@ -16,6 +20,9 @@ except ImportError:
 
 log = logging.getLogger(__name__)
 
+T = TypeVar("T")
+R = TypeVar("R")
+
 
 def parse_file(filename: str) -> Dict[str, Any]:
     data: Dict[str, Any] = {}
@@ -37,14 +44,65 @@ def parse_file(filename: str) -> Dict[str, Any]:
     return data
 
 
-def load_and_parse_schema(host: HostResolved) -> List[Schema]:
+def load_schema_payload(
+    host: HostResolved,
+    cache: Optional[ResponseCache] = None,
+    info: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
     if "dhis2" not in host.type:
         log.error(f"'{host.key}' is of unsupported type '{host.type}', only 'dhis2' is supported for this command")
         return None
 
     req = BaseHttpRequest(host)
-    data = req.get("api/schemas")
+
+    if cache is None:
+        return req.get("api/schemas")
+
+    # schemas only change between versions, so the payload is cached per version/revision
+    if info is None:
+        info = req.get("api/system/info")
+
+    key = cache.key(host.baseUrl, "api/schemas", info.get("version"), info.get("revision"))
+
+    return cache.fetch(key, lambda: req.get("api/schemas"))
+
+
+def load_and_parse_schema(host: HostResolved, cache: Optional[ResponseCache] = None) -> List[Schema]:
+    data = load_schema_payload(host, cache)
+
+    if not data:
+        return None
 
     schemas = Schemas(**data)
 
     return schemas.schemas
+
+
+def compact(data: Dict[str, Any]) -> Dict[str, Any]:
+    return {key: value for key, value in data.items() if value is not None}
+
+
+def chunked(iterable: Iterable[T], size: int) -> Iterator[List[T]]:
+    iterator = iter(iterable)
+
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def bounded_map(fn: Callable[[T], R], iterable: Iterable[T], workers: int = 1) -> Iterator[R]:
+    # like map, but runs up to `workers` calls at a time and only consumes the iterable as needed
+    if workers <= 1:
+        yield from map(fn, iterable)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending: Deque = deque()
+
+        for item in iterable:
+            pending.append(executor.submit(fn, item))
+
+            if len(pending) >= workers:
+                yield pending.popleft().result()
+
+        while pending:
+            yield pending.popleft().result()
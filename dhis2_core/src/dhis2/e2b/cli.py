@@ -1,13 +1,19 @@
 #!/usr/bin/env python
 
-from typing import Dict
+import logging
+from typing import BinaryIO, Iterator, List, Optional
 
 import click
 import dhis2.e2b.r2 as r2
 from dhis2.core.http import BaseHttpRequest
 from dhis2.core.inventory import HostResolved, resolve_one
+from dhis2.core.utils import chunked
 
-from .models.e2b import AttributeValue, EventDataValue, TrackedEntity
+from .mapping import AEFIMappingPlan, load_mapping
+from .models.e2b import AEFIMapping
+from .tracked_entity import TRACKED_ENTITY_FIELDS, IndexedTrackedEntity
+
+log = logging.getLogger(__name__)
 
 
 def require_program(host: HostResolved, pr: str) -> None:
@@ -15,46 +21,62 @@ def require_program(host: HostResolved, pr: str) -> None:
     request.get(f"api/programs/{pr}")
 
 
-def get_aefi_patient(host: HostResolved, pr: str, te: str) -> TrackedEntity:
+def get_aefi_patients(
+    host: HostResolved,
+    pr: str,
+    tracked_entities: List[str] = [],
+    org_unit: Optional[str] = None,
+    ou_mode: str = "DESCENDANTS",
+    last_updated_start_date: Optional[str] = None,
+    last_updated_end_date: Optional[str] = None,
+    page_size: int = 100,
+    mapping: Optional[AEFIMapping] = None,
+) -> Iterator[IndexedTrackedEntity]:
     require_program(host, pr)
+    plan = AEFIMappingPlan(mapping or AEFIMapping())
     request = BaseHttpRequest(host)
-    response = request.get(
-        f"api/trackedEntityInstances/{te}",
-        params={
-            "fields": "*",
-            "program": pr,
-        },
-    )
 
-    te = TrackedEntity(**response)
+    params = {
+        "fields": TRACKED_ENTITY_FIELDS,
+        "program": pr,
+    }
 
-    attributes: Dict[str, AttributeValue] = {}
+    if org_unit:
+        params["ou"] = org_unit
+        params["ouMode"] = ou_mode
 
-    for av in te.attributes:
-        attributes[av.attribute] = av
+    if last_updated_start_date:
+        params["lastUpdatedStartDate"] = last_updated_start_date
 
-    for en in te.enrollments:
-        for av in en.attributes:
-            attributes[av.attribute] = av
+    if last_updated_end_date:
+        params["lastUpdatedEndDate"] = last_updated_end_date
 
-        del en.attributes
+    queries = [params]
 
-        events = {}
+    if tracked_entities:
+        # keep urls short by only asking for a limited number of tracked entities per query
+        queries = [{**params, "trackedEntityInstance": ";".join(tes)} for tes in chunked(tracked_entities, page_size)]
 
-        for ev in en.events:
-            dataValues: Dict[str, EventDataValue] = {}
+    count = 0
 
-            for dv in ev.dataValues:
-                dataValues[dv.dataElement] = dv
+    for query in queries:
+        for te in request.get_paged(
+            "api/trackedEntityInstances",
+            "trackedEntityInstances",
+            params=query,
+            page_size=page_size,
+        ):
+            te = plan.index(te)
 
-            events[ev.programStage] = ev
-            ev.dataValues = dataValues
+            if not te.enrollments:
+                log.warning(f"Ignoring tracked entity '{te.trackedEntityInstance}' without enrollments")
+                continue
 
-        en.events = events
+            count += 1
 
-    te.attributes = attributes
+            yield te
 
-    return te
+    log.info(f"Fetched {count} tracked entities")
 
 
 @click.command("e2b")
@@ -64,7 +86,15 @@ def get_aefi_patient(host: HostResolved, pr: str, te: str) -> TrackedEntity:
 @click.option("--receiver-id", default="unknown")
 @click.option("--receiver-organization", default="WHO-UMC")
 @click.option("--receiver-code", default="SE")
-@click.option("--tracked-entity", default="zAt1I8i6c83")
+@click.option("--program", help="AEFI program, defaults to the program of the mapping")
+@click.option("--mapping", type=click.Path(exists=True, dir_okay=False), help="AEFI mapping file (yml/json)")
+@click.option("--tracked-entity", multiple=True, help="Tracked entity to export, can be repeated")
+@click.option("--org-unit", help="Export all tracked entities of org unit")
+@click.option("--ou-mode", type=click.Choice(["SELECTED", "CHILDREN", "DESCENDANTS"]), default="DESCENDANTS")
+@click.option("--last-updated-start-date")
+@click.option("--last-updated-end-date")
+@click.option("--page-size", default=100, type=click.IntRange(min=1))
+@click.option("--output", type=click.File("wb"), default="-", help="Output file, defaults to stdout")
 @click.pass_obj
 def cmd_e2b(
     ctx,
@@ -74,19 +104,44 @@ def cmd_e2b(
     receiver_id: str,
     receiver_organization: str,
     receiver_code: str,
-    tracked_entity: str,
+    program: str,
+    mapping: str,
+    tracked_entity: List[str],
+    org_unit: str,
+    ou_mode: str,
+    last_updated_start_date: str,
+    last_updated_end_date: str,
+    page_size: int,
+    output: BinaryIO,
 ):
     """ Individual Case Safety Reports E2B (R2) """
     host = resolve_one(host_id, ctx.inventory)
-    te = get_aefi_patient(host, "EZkN8vYZwjR", tracked_entity)
+    aefi_mapping = load_mapping(mapping)
+
+    if not tracked_entity and not org_unit:
+        tracked_entity = ["zAt1I8i6c83"]
+
+    tes = get_aefi_patients(
+        host,
+        program or aefi_mapping.program,
+        tracked_entities=list(tracked_entity),
+        org_unit=org_unit,
+        ou_mode=ou_mode,
+        last_updated_start_date=last_updated_start_date,
+        last_updated_end_date=last_updated_end_date,
+        page_size=page_size,
+        mapping=aefi_mapping,
+    )
 
     r2.run(
-        [te],
+        tes,
         sender_id=sender_id,
         receiver_id=receiver_id,
         country=country,
         receiverorganization=receiver_organization,
         receivercountrycode=receiver_code,
+        output=output,
+        mapping=aefi_mapping,
     )
 
 
@@ -1,7 +1,7 @@
 from datetime import datetime
-from typing import Union
+from typing import Optional, Union
 
-from .models.e2b import Enrollment, Event, EventDataValue, TrackedEntity
+from .tracked_entity import IndexedTrackedEntity
 
 
 def date_format_102(dt: datetime) -> str:
@@ -16,34 +16,16 @@ def date_format_203(dt: datetime) -> str:
     return dt.strftime("%Y%m%d%H%M")
 
 
-def get_attribute_value(at: str, te: TrackedEntity, defaultValue=None) -> Union[str, None]:
-    av = te.attributes.get(at, defaultValue)
+def get_attribute_value(at: str, te: IndexedTrackedEntity, defaultValue=None) -> Union[str, None]:
+    value = te.attributes.get(at)
 
-    if not av:
-        return defaultValue
-
-    if av.value:
-        return av.value
-
-    return defaultValue
-
-
-def get_data_value(de: str, te: TrackedEntity, idx: int = 0, defaultValue=None) -> Union[str, None]:
-    en: Enrollment = te.enrollments[idx]
-    ev: Event = en.events["so8YZ9J3MeO"]  # AEFI stage
-
-    if de not in ev.dataValues:
-        return defaultValue
-
-    dv: EventDataValue = ev.dataValues[de]
-
-    if dv:
-        return dv.value
+    if value:
+        return value
 
     return defaultValue
 
 
-def get_patient_age(te: TrackedEntity):
+def get_patient_age(te: IndexedTrackedEntity):
     value = get_attribute_value("BiTsLcJQ95V", te)
     dt = datetime.fromisoformat(value)
     now = datetime.now()
@@ -61,21 +43,14 @@ def get_patient_age(te: TrackedEntity):
     return ("804", str(now.day - dt.day))
 
 
-def get_yes_no(de: str, te: TrackedEntity, idx: int = 0):
-    dv: EventDataValue = get_data_value(de, te, idx)
-
-    if "true" == dv:
+def yes_no(value: Optional[str]) -> str:
+    if "true" == value:
         return "1"
 
     return "2"
 
 
-def get_patient_sex(te: TrackedEntity) -> str:
-    value = get_attribute_value("CklPZdOd6H1", te)
-
-    if not value:
-        value = get_attribute_value("oindugucx72", te)
-
+def patient_sex(value: Optional[str]) -> str:
     if "MALE" == value:
         return "1"
     elif "FEMALE" == value:
@@ -84,9 +59,7 @@ def get_patient_sex(te: TrackedEntity) -> str:
     return ""
 
 
-def get_reaction_outcome(te: TrackedEntity):
-    value = get_data_value("yRrSDiR5v1M", te)
-
+def reaction_outcome(value: Optional[str]) -> Optional[str]:
     if "Recovered/resolved" == value:
         return "1"
     elif "Recovering/resolving" == value:
@@ -1,26 +1,21 @@
 import logging
 from datetime import datetime
+from itertools import chain
+from typing import BinaryIO, Iterable, Optional
 from uuid import uuid4
 
 from lxml import etree
 from lxml.builder import E
 
-from .common import (
-    date_format_102,
-    date_format_203,
-    date_format_204,
-    get_attribute_value,
-    get_data_value,
-    get_patient_sex,
-    get_reaction_outcome,
-    get_yes_no,
-)
-from .models.e2b import Enrollment, TrackedEntity
+from .common import date_format_102, date_format_203, date_format_204, patient_sex, reaction_outcome, yes_no
+from .mapping import AEFIRecord
 
 log = logging.getLogger(__name__)
 
+DOCTYPE = '<!DOCTYPE ichicsr SYSTEM "http://eudravigilance.ema.europa.eu/dtd/icsr21xml.dtd">'
 
-def build_messageheader(root: etree.Element, sender_id: str, receiver_id: str):
+
+def build_messageheader(root: Optional[etree.Element], sender_id: str, receiver_id: str) -> etree.Element:
     mh = E.ichicsrmessageheader(
         E.messagetype("ichicsr"),
         E.messageformatversion("2.1"),
@@ -32,7 +27,10 @@ def build_messageheader(root: etree.Element, sender_id: str, receiver_id: str):
         E.messagedate(date_format_204(datetime.now())),
     )
 
-    root.append(mh)
+    if root is not None:
+        root.append(mh)
+
+    return mh
 
 
 def build_safetyreport_patient_drug(
@@ -104,131 +102,30 @@ def build_safetyreport_patient_drug(
         drug.append(E.drugadditional(", ".join(dilutent)))
 
 
-def build_safetyreport_patient_drugs(root: etree.Element, te: TrackedEntity):
-    vaccine1_name = get_data_value("uSVcZzSM3zg", te)
-    vaccine1_brand = get_data_value("JSd0HQOgJ8w", te)
-    vaccine1_date = get_data_value("dOkuCjpD978", te)
-    vaccine1_time = get_data_value("BSUncNBb20j", te, defaultValue="00:00")
-    vaccine1_batch = get_data_value("LNqkAlvGplL", te)
-    vaccine1_dose = get_data_value("LIyV4t7eCfZ", te)
-    vaccine1_expiry = get_data_value("VFrc8SNFYm7", te)
-    vaccine2_name = get_data_value("g9PjywVj2fs", te)
-    vaccine2_brand = get_data_value("eRwc8Y0CNLh", te)
-    vaccine2_date = get_data_value("VrzEutEnzSJ", te)
-    vaccine2_time = get_data_value("fZFQVZFqu0q", te, defaultValue="00:00")
-    vaccine2_batch = get_data_value("b1rSwGRcY5W", te)
-    vaccine2_dose = get_data_value("E3F414izniN", te)
-    vaccine2_expiry = get_data_value("rVUo2PBgwhr", te)
-    vaccine3_name = get_data_value("OU5klvkk3SM", te)
-    vaccine3_brand = get_data_value("wdZrkUvnuyr", te)
-    vaccine3_date = get_data_value("f4WCAVwjHz0", te)
-    vaccine3_time = get_data_value("VQKdZ1KeD7u", te, defaultValue="00:00")
-    vaccine3_batch = get_data_value("YBnFoNouH6f", te)
-    vaccine3_dose = get_data_value("WlE0K4xCc14", te)
-    vaccine3_expiry = get_data_value("ffYfdSPmM1W", te)
-    vaccine4_name = get_data_value("menOXwIFZh5", te)
-    vaccine4_brand = get_data_value("Ptms0lmt4QX", te)
-    vaccine4_date = get_data_value("H3TKHMFIN6V", te)
-    vaccine4_time = get_data_value("S1PRFSk8Y9v", te, defaultValue="00:00")
-    vaccine4_batch = get_data_value("BHAfwo6JPDa", te)
-    vaccine4_dose = get_data_value("Aya8C25DXHe", te)
-    vaccine4_expiry = get_data_value("ZfjyIKeX1AN", te)
-
-    diluent1_name = get_data_value("xk9QvZPMVQF", te)
-    diluent1_batch = get_data_value("FQM2ksIQix8", te)
-    diluent1_expiry = get_data_value("cKx0VCmLrsc", te)
-    diluent1_dor = get_data_value("om7AsREDduc", te)  # Date of reconstitution
-    diluent1_tor = get_data_value("zIKVrYHtdUx", te)  # Time of reconstitution
-    diluent2_name = get_data_value("WN8844HG0zi", te)
-    diluent2_batch = get_data_value("ufWU3WStZgG", te)
-    diluent2_expiry = get_data_value("FcqNLPNUPId", te)
-    diluent2_dor = get_data_value("xXjnT9sjt4F", te)  # Date of reconstitution
-    diluent2_tor = get_data_value("KTHsZhIAGWf", te)  # Time of reconstitution
-    diluent3_name = get_data_value("pLu0luPWikb", te)
-    diluent3_batch = get_data_value("MLP8fi1X7UX", te)
-    diluent3_expiry = get_data_value("MGjnXmtmd7l", te)
-    diluent3_dor = get_data_value("fW6RbpJk4hS", te)  # Date of reconstitution
-    diluent3_tor = get_data_value("gG0FZYpEctJ", te)  # Time of reconstitution
-    diluent4_name = get_data_value("ZTyN8vSf7bc", te)
-    diluent4_batch = get_data_value("MyWtDaOdlyD", te)
-    diluent4_expiry = get_data_value("qhDonTAIjl0", te)
-    diluent4_dor = get_data_value("va0Smpy0LUn", te)  # Date of reconstitution
-    diluent4_tor = get_data_value("EDdd0HsfLcO", te)  # Time of reconstitution
-
-    if vaccine1_name:
+def build_safetyreport_patient_drugs(root: etree.Element, record: AEFIRecord):
+    for vaccine in record.vaccines:
         build_safetyreport_patient_drug(
             root,
-            name=vaccine1_name,
-            brand=vaccine1_brand,
-            date=vaccine1_date,
-            time=vaccine1_time,
-            batch=vaccine1_batch or "",
-            dose=vaccine1_dose,
-            expiry=vaccine1_expiry,
-            diluent_name=diluent1_name,
-            diluent_batch=diluent1_batch,
-            diluent_expiry=diluent1_expiry,
-            diluent_dor=diluent1_dor,
-            diluent_tor=diluent1_tor,
+            name=vaccine["name"],
+            brand=vaccine.get("brand"),
+            date=vaccine.get("date"),
+            time=vaccine.get("time", "00:00"),
+            batch=vaccine.get("batch") or "",
+            dose=vaccine.get("dose"),
+            expiry=vaccine.get("expiry"),
+            diluent_name=vaccine.get("diluentName"),
+            diluent_batch=vaccine.get("diluentBatch"),
+            diluent_expiry=vaccine.get("diluentExpiry"),
+            diluent_dor=vaccine.get("diluentDateOfReconstitution"),
+            diluent_tor=vaccine.get("diluentTimeOfReconstitution"),
         )
 
-    if vaccine2_name:
-        build_safetyreport_patient_drug(
-            root,
-            name=vaccine2_name,
-            brand=vaccine2_brand,
-            date=vaccine2_date,
-            time=vaccine2_time,
-            batch=vaccine2_batch or "",
-            dose=vaccine2_dose,
-            expiry=vaccine2_expiry,
-            diluent_name=diluent2_name,
-            diluent_batch=diluent2_batch,
-            diluent_expiry=diluent2_expiry,
-            diluent_dor=diluent2_dor,
-            diluent_tor=diluent2_tor,
-        )
-
-    if vaccine3_name:
-        build_safetyreport_patient_drug(
-            root,
-            name=vaccine3_name,
-            brand=vaccine3_brand,
-            date=vaccine3_date,
-            time=vaccine3_time,
-            batch=vaccine3_batch or "",
-            dose=vaccine3_dose,
-            expiry=vaccine3_expiry,
-            diluent_name=diluent3_name,
-            diluent_batch=diluent3_batch,
-            diluent_expiry=diluent3_expiry,
-            diluent_dor=diluent3_dor,
-            diluent_tor=diluent3_tor,
-        )
 
-    if vaccine4_name:
-        build_safetyreport_patient_drug(
-            root,
-            name=vaccine4_name,
-            brand=vaccine4_brand,
-            date=vaccine4_date,
-            time=vaccine4_time,
-            batch=vaccine4_batch or "",
-            dose=vaccine4_dose,
-            expiry=vaccine4_expiry,
-            diluent_name=diluent4_name,
-            diluent_batch=diluent4_batch,
-            diluent_expiry=diluent4_expiry,
-            diluent_dor=diluent4_dor,
-            diluent_tor=diluent4_tor,
-        )
-
-
-def build_safetyreport_patient_reaction(root: etree.Element, te: TrackedEntity, reaction: str):
+def build_safetyreport_patient_reaction(root: etree.Element, record: AEFIRecord, reaction: str):
     p = etree.SubElement(root, "reaction")
-    outcome = get_reaction_outcome(te)
-    startdate = get_data_value("vNGUuAZA2C2", te)
-    startTime = get_data_value("NyCB1VAOfJd", te, defaultValue="00:00")
+    outcome = reaction_outcome(record.value("outcome"))
+    startdate = record.value("reactionStartDate")
+    startTime = record.value("reactionStartTime", "00:00")
 
     p.append(E.primarysourcereaction(reaction))
 
@@ -241,136 +138,16 @@ def build_safetyreport_patient_reaction(root: etree.Element, te: TrackedEntity,
         p.append(E.reactionoutcome(outcome))
 
 
-def build_safetyreport_patient_reactions(root: etree.Element, te: TrackedEntity):
-    if get_data_value("UNmEidE6M9K", te):
-        reaction = "Severe local reaction"
-
-        if get_data_value("We87rvcvd8J", te):
-            reaction += ", >3 days"
-
-        if get_data_value("f8hjxmHOtAB", te):
-            reaction += ", Beyond nearest joint"
-
-        build_safetyreport_patient_reaction(root, te, reaction)
-
-    if get_data_value("wCGZpudXuYx", te):
-        seizures_type = get_data_value("Zz4KYO4AsSY", te)
-
-        if seizures_type:
-            build_safetyreport_patient_reaction(root, te, f"Seizures ({seizures_type})")
-        else:
-            build_safetyreport_patient_reaction(root, te, "Seizures")
-
-    if get_data_value("wce39JmsjIK", te):
-        build_safetyreport_patient_reaction(root, te, "Abscess")
-
-    if get_data_value("tUmgO1Ugv6U", te):
-        build_safetyreport_patient_reaction(root, te, "Sepsis")
-
-    if get_data_value("pdpAEuUS1W9", te):
-        build_safetyreport_patient_reaction(root, te, "Encephalopathy")
-
-    if get_data_value("Apq4JaueuWR", te):
-        build_safetyreport_patient_reaction(root, te, "Toxic shock syndrome")
-
-    if get_data_value("GGLLaieVChK", te):
-        build_safetyreport_patient_reaction(root, te, "Thrombocytopenia")
-
-    if get_data_value("MkIgCrCTFyE", te):
-        build_safetyreport_patient_reaction(root, te, "Anaphylaxis")
-
-    if get_data_value("rzhHSqK3lQq", te):
-        build_safetyreport_patient_reaction(root, te, "Fever (> 38°C)")
-
-    if get_data_value("HY6NIt2FX4A", te):
-        build_safetyreport_patient_reaction(root, te, "Headache")
-
-    if get_data_value("PWOzcN7UCfW", te):
-        build_safetyreport_patient_reaction(root, te, "Irritability")
-
-    if get_data_value("seXW1hERwOo", te):
-        build_safetyreport_patient_reaction(root, te, "Sore Throat")
-
-    if get_data_value("vCfZD893IVe", te):
-        build_safetyreport_patient_reaction(root, te, "Joint Pain")
-
-    if get_data_value("T6tsxbKzikz", te):
-        build_safetyreport_patient_reaction(root, te, "Abdominal Pain")
-
-    if get_data_value("ZdFB8xUhOUM", te):
-        build_safetyreport_patient_reaction(root, te, "Cough")
+def build_safetyreport_patient_reactions(root: etree.Element, record: AEFIRecord):
+    for reaction in record.reactions:
+        build_safetyreport_patient_reaction(root, record, reaction)
 
-    if get_data_value("KOt0J61mF61", te):
-        build_safetyreport_patient_reaction(root, te, "Nausea")
 
-    if get_data_value("NAiZTRCHRWL", te):
-        build_safetyreport_patient_reaction(root, te, "Diarrhoea")
-
-    if get_data_value("owRcSysyioE", te):
-        build_safetyreport_patient_reaction(root, te, "Fatigue")
-
-    if get_data_value("cMEIyp0rMo1", te):
-        build_safetyreport_patient_reaction(root, te, "Vomiting")
-
-    if get_data_value("P4oSprWWqrn", te):
-        build_safetyreport_patient_reaction(root, te, "Injection site soreness")
-
-    if get_data_value("KqlCtmOWt4G", te):
-        build_safetyreport_patient_reaction(root, te, "Injection site tenderness")
-
-    if get_data_value("xgqzqv0p2Us", te):
-        build_safetyreport_patient_reaction(root, te, "Skin rash")
-
-    if get_data_value("FC54HsGMErl", te):
-        build_safetyreport_patient_reaction(root, te, "Itching")
-
-    if get_data_value("pzOF4lGIyTU", te):
-        build_safetyreport_patient_reaction(root, te, "Muscle pain")
-
-    if get_data_value("GTyK3p976de", te):
-        build_safetyreport_patient_reaction(root, te, "Persistent crying")
-
-    if get_data_value("sX1SvRadOmn", te):
-        build_safetyreport_patient_reaction(root, te, "Poor breast feeding")
-
-    if get_data_value("QFMRugi3fm6", te):
-        build_safetyreport_patient_reaction(root, te, "Loss of apetite")
-
-    if get_data_value("TPSvWhUfib3", te):
-        build_safetyreport_patient_reaction(root, te, "Chills")
-
-    if get_data_value("OhHYABXmGGe", te):
-        build_safetyreport_patient_reaction(root, te, "Fainting")
-
-    if get_data_value("nKLO8ZNdR0B", te):
-        build_safetyreport_patient_reaction(root, te, "Mild fever")
-
-    if get_data_value("JaZ9yf1dDy3", te):
-        build_safetyreport_patient_reaction(root, te, "Tiredness")
-
-    if get_data_value("wWDenTQ5xBR", te):
-        build_safetyreport_patient_reaction(root, te, "Nasal congestion")
-
-    if get_data_value("GEkI9NzxTmM", te):
-        build_safetyreport_patient_reaction(root, te, "Lymph node enlargement")
-
-    if get_data_value("XluNAFG1wj6", te):
-        build_safetyreport_patient_reaction(root, te, "Dizziness")
-
-    if get_data_value("rjjRNU5yDhT", te):
-        build_safetyreport_patient_reaction(root, te, "Drowsiness")
-
-    other = get_data_value("iTm5wvq16iq", te)
-
-    if other:
-        build_safetyreport_patient_reaction(root, te, other)
-
-
-def build_safetyreport_patient(root: etree.Element, te: TrackedEntity):
+def build_safetyreport_patient(root: etree.Element, record: AEFIRecord):
     p = etree.SubElement(root, "patient")
 
-    given_name = get_attribute_value("TfdH5KvFmMy", te)
-    family_name = get_attribute_value("aW66s2QSosT", te)
+    given_name = record.attribute("givenName")
+    family_name = record.attribute("familyName")
 
     if given_name:
         name = given_name
@@ -380,10 +157,7 @@ def build_safetyreport_patient(root: etree.Element, te: TrackedEntity):
 
         p.append(E.patientinitial(name))  # should we use name here or not?
 
-    dt = get_attribute_value("BiTsLcJQ95V", te)
-
-    if not dt:
-        dt = get_attribute_value("NI0QRzJvQ0k", te)  # MU
+    dt = record.attribute("birthDate")
 
     if dt:
         dt = datetime.fromisoformat(dt)
@@ -391,20 +165,20 @@ def build_safetyreport_patient(root: etree.Element, te: TrackedEntity):
         p.append(E.patientbirthdateformat("102"))
         p.append(E.patientbirthdate(dob))
 
-    p.append(E.patientsex(get_patient_sex(te)))
+    p.append(E.patientsex(patient_sex(record.attribute("sex"))))
 
-    if get_yes_no("VXdRoWQOBxG", te):
+    if yes_no(record.value("medicalHistory")):
         p.append(
             E.medicalhistoryepisode(
-                E.patientmedicalcomment(get_data_value("AfrWB2ofm7l", te) or ""),
+                E.patientmedicalcomment(record.value("medicalHistoryComment") or ""),
             )
         )
 
-    dead = get_yes_no("DOA6ZFMro84", te) == "1"
+    dead = yes_no(record.value("death")) == "1"
 
     if dead:
-        date_of_death = get_data_value("Ze34uXcBUxi", te)
-        autopsyyesno = get_data_value("yRrSDiR5v1M", te) == "Autopsy done"
+        date_of_death = record.value("dateOfDeath")
+        autopsyyesno = record.value("outcome") == "Autopsy done"
 
         if autopsyyesno:
             autopsyyesno = "1"
@@ -425,27 +199,29 @@ def build_safetyreport_patient(root: etree.Element, te: TrackedEntity):
                 )
             )
 
-    build_safetyreport_patient_reactions(p, te)
-    build_safetyreport_patient_drugs(p, te)
+    build_safetyreport_patient_reactions(p, record)
+    build_safetyreport_patient_drugs(p, record)
 
     p.append(
         E.summary(
-            E.reportercomment(get_data_value("IV9W7YXh939", te, 0, "")),
+            E.reportercomment(record.value("reporterComment", "")),
         )
     )
 
 
 def build_safetyreport(
-    root: etree.Element,
-    te: TrackedEntity,
-    en: Enrollment,
+    root: Optional[etree.Element],
+    record: AEFIRecord,
     country: str,
     receiverorganization: str,
     receivercountrycode: str,
-):
-    sr = etree.SubElement(root, "safetyreport")
+) -> etree.Element:
+    sr = E.safetyreport()
+
+    if root is not None:
+        root.append(sr)
 
-    id = get_attribute_value("h5FuguPFF2j", te)
+    id = record.attribute("safetyReportId")
 
     if country:
         country = country.upper()
@@ -462,20 +238,20 @@ def build_safetyreport(
     sr.append(E.transmissiondateformat("102"))
     sr.append(E.transmissiondate(date_format_102(datetime.now())))
     sr.append(E.reporttype("1"))
-    sr.append(E.serious(get_yes_no("fq1c1A3EOX5", te)))
+    sr.append(E.serious(yes_no(record.value("serious"))))
 
-    dead = get_yes_no("DOA6ZFMro84", te) == "1"
+    dead = yes_no(record.value("death")) == "1"
 
     if dead:
         sr.append(E.seriousnessdeath("1"))
     else:
         sr.append(E.seriousnessdeath("2"))
 
-    sr.append(E.seriousnesslifethreatening(get_yes_no("lATDYNmTLKD", te)))
-    sr.append(E.seriousnesshospitalization(get_yes_no("Il1lTfknLdd", te)))
-    sr.append(E.seriousnessdisabling(get_yes_no("lsO8n8ZmLAB", te)))
-    sr.append(E.seriousnesscongenitalanomali(get_yes_no("lSBsxcQU0kO", te)))
-    sr.append(E.seriousnessother(get_yes_no("tWcNgbkOETR", te)))
+    sr.append(E.seriousnesslifethreatening(yes_no(record.value("lifeThreatening"))))
+    sr.append(E.seriousnesshospitalization(yes_no(record.value("hospitalization"))))
+    sr.append(E.seriousnessdisabling(yes_no(record.value("disabling"))))
+    sr.append(E.seriousnesscongenitalanomali(yes_no(record.value("congenitalAnomaly"))))
+    sr.append(E.seriousnessother(yes_no(record.value("otherSerious"))))
     sr.append(E.receivedateformat("102"))
     sr.append(E.receivedate(date_format_102(datetime.now())))
     sr.append(E.receiptdateformat("102"))
@@ -483,13 +259,13 @@ def build_safetyreport(
     sr.append(E.additionaldocument("2"))
     # sr.append(E.fulfillexpeditecriteria("1"))
 
-    reporter_name = get_data_value("uZ9c4fKXuNS", te)
+    reporter_name = record.value("reporterName") or ""
     qualification = "1" if reporter_name.upper().startswith("DR ") else "3"
 
     sr.append(
         E.primarysource(
             E.reportergivename(reporter_name),
-            E.reporterorganization(get_data_value("Q20pEixZxCs", te)),  # TODO resolve org unit
+            E.reporterorganization(record.value("reporterOrganization") or ""),  # TODO resolve org unit
             E.qualification(qualification),
         )
     )
@@ -508,7 +284,9 @@ def build_safetyreport(
         )
     )
 
-    build_safetyreport_patient(sr, te)
+    build_safetyreport_patient(sr, record)
+
+    return sr
 
 
 def print_root(root: etree.Element, pretty_print: bool = True):
@@ -518,6 +296,24 @@ def print_root(root: etree.Element, pretty_print: bool = True):
             pretty_print=pretty_print,
             standalone=False,
             encoding="UTF-8",
-            doctype='<!DOCTYPE ichicsr SYSTEM "http://eudravigilance.ema.europa.eu/dtd/icsr21xml.dtd">',
+            doctype=DOCTYPE,
         ).decode()
     )
+
+
+def write_ichicsr(output: BinaryIO, messageheader: etree.Element, safetyreports: Iterable[etree.Element]):
+    # writes the message incrementally, each safety report is written as soon as it is built
+    with etree.xmlfile(output, encoding="UTF-8") as xf:
+        xf.write_declaration(standalone=False)
+        xf.write_doctype(DOCTYPE)
+
+        with xf.element("ichicsr", lang="en"):
+            for el in chain([messageheader], safetyreports):
+                etree.indent(el, space="  ", level=1)
+                xf.write("\n  ", el)
+                xf.flush()
+
+            xf.write("\n")
+
+    output.write(b"\n")
+    output.flush()
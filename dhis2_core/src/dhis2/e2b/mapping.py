@@ -0,0 +1,144 @@
+import logging
+import sys
+from typing import Any, Dict, FrozenSet, List, Mapping, Optional, Tuple
+
+from dhis2.core.utils import parse_file
+from pydantic import ValidationError
+
+from .models.e2b import AEFIMapping
+from .tracked_entity import IndexedTrackedEntity, index_tracked_entity
+
+log = logging.getLogger(__name__)
+
+
+class AEFIRecord:
+    """ Values of one tracked entity needed for a safety report, keyed by mapping field names """
+
+    __slots__ = ("attributes", "values", "vaccines", "reactions")
+
+    def __init__(
+        self,
+        attributes: Dict[str, Optional[str]],
+        values: Dict[str, str],
+        vaccines: Tuple[Dict[str, str], ...],
+        reactions: Tuple[str, ...],
+    ):
+        self.attributes = attributes
+        self.values = values
+        self.vaccines = vaccines
+        self.reactions = reactions
+
+    def attribute(self, field: str) -> Optional[str]:
+        return self.attributes.get(field)
+
+    def value(self, field: str, defaultValue=None) -> Optional[str]:
+        return self.values.get(field, defaultValue)
+
+
+class AEFIMappingPlan:
+    """ Mapping compiled into flat lookup tables, built once and applied to every tracked entity """
+
+    __slots__ = (
+        "mapping",
+        "program_stage",
+        "attributes",
+        "data_elements",
+        "vaccines",
+        "reactions",
+        "other_reaction",
+        "attribute_ids",
+        "data_element_ids",
+    )
+
+    def __init__(self, mapping: AEFIMapping):
+        self.mapping = mapping
+        self.program_stage = mapping.programStage
+        self.attributes: Tuple[Tuple[str, Tuple[str, ...]], ...] = tuple(
+            (field, tuple(ids) if isinstance(ids, list) else (ids,)) for field, ids in mapping.attributes
+        )
+        self.data_elements: Tuple[Tuple[str, str], ...] = tuple(mapping.dataElements)
+        self.vaccines: Tuple[Tuple[str, Tuple[Tuple[str, str], ...]], ...] = tuple(
+            (vaccine.name, tuple(vaccine)) for vaccine in mapping.vaccines
+        )
+        self.reactions: Tuple[Tuple[str, str, Optional[str], Tuple[Tuple[str, str], ...]], ...] = tuple(
+            (r.dataElement, r.name, r.typeDataElement, tuple(r.qualifiers.items())) for r in mapping.reactions
+        )
+        self.other_reaction = mapping.dataElements.otherReaction
+        self.attribute_ids: FrozenSet[str] = frozenset(id for _, ids in self.attributes for id in ids)
+        self.data_element_ids: FrozenSet[str] = frozenset(self._get_data_element_ids())
+
+    def _get_data_element_ids(self) -> List[str]:
+        ids: List[str] = [de for _, de in self.data_elements]
+        ids.extend(de for _, fields in self.vaccines for _, de in fields)
+
+        for de, _, type_de, qualifiers in self.reactions:
+            ids.append(de)
+
+            if type_de:
+                ids.append(type_de)
+
+            ids.extend(q for q, _ in qualifiers)
+
+        return ids
+
+    def index(self, data: Dict[str, Any]) -> IndexedTrackedEntity:
+        return index_tracked_entity(data, self.attribute_ids, self.data_element_ids)
+
+    def extract(self, te: IndexedTrackedEntity) -> AEFIRecord:
+        attributes: Dict[str, Optional[str]] = {}
+
+        for field, ids in self.attributes:
+            attributes[field] = None
+
+            for id in ids:
+                value = te.attributes.get(id)
+
+                if value:
+                    attributes[field] = value
+                    break
+
+        ev = te.enrollments[0].events.get(self.program_stage)
+        dvs: Mapping[str, str] = ev.dataValues if ev else {}
+
+        values = {field: dvs[de] for field, de in self.data_elements if de in dvs}
+
+        vaccines = tuple(
+            {field: dvs[de] for field, de in fields if de in dvs} for name, fields in self.vaccines if dvs.get(name)
+        )
+
+        reactions: List[str] = []
+
+        for de, name, type_de, qualifiers in self.reactions:
+            if not dvs.get(de):
+                continue
+
+            if type_de and dvs.get(type_de):
+                name = f"{name} ({dvs[type_de]})"
+
+            for q, text in qualifiers:
+                if dvs.get(q):
+                    name = f"{name}, {text}"
+
+            reactions.append(name)
+
+        if dvs.get(self.other_reaction):
+            reactions.append(dvs[self.other_reaction])
+
+        return AEFIRecord(attributes, values, vaccines, tuple(reactions))
+
+
+def load_mapping(filename: Optional[str] = None) -> AEFIMapping:
+    if not filename:
+        return AEFIMapping()
+
+    data = parse_file(filename)
+
+    if not data:
+        log.error(f"Invalid AEFI mapping file '{filename}'")
+        sys.exit(-1)
+
+    try:
+        return AEFIMapping(**data)
+    except ValidationError as e:
+        log.error(f"Invalid AEFI mapping file '{filename}': {e}")
+        sys.exit(-1)
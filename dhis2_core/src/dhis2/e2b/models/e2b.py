@@ -1,70 +1,168 @@
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional
 from pydantic import BaseModel, Field
-from datetime import datetime
 from uuid import uuid4
 
 
-class AttributeValue(BaseModel):
-    created: datetime
-    lastUpdated: datetime
-    attribute: str
-    value: str
-    storedBy: Optional[str]
+class E2BR2Source(BaseModel):
+    id: str
 
 
-class EventDataValue(BaseModel):
-    created: datetime
-    lastUpdated: datetime
-    dataElement: str
-    value: str
-    providedElsewhere: bool
-    storedBy: Optional[str]
+class E2BR2Config(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid4()))
+    source: E2BR2Source
 
 
-class Event(BaseModel):
-    created: datetime
-    lastUpdated: datetime
-    event: str
-    program: str
-    programStage: str
-    trackedEntityInstance: str
-    orgUnit: str
-    status: str
-    dueDate: datetime
-    eventDate: datetime
-    completedDate: Optional[str]
-    storedBy: Optional[str]
-    dataValues: Union[Dict[str, EventDataValue], List[EventDataValue]] = []
+class AEFIAttributeMapping(BaseModel):
+    safetyReportId: str = "h5FuguPFF2j"
+    givenName: str = "TfdH5KvFmMy"
+    familyName: str = "aW66s2QSosT"
+    birthDate: List[str] = ["BiTsLcJQ95V", "NI0QRzJvQ0k"]  # first attribute with a value is used
+    sex: List[str] = ["CklPZdOd6H1", "oindugucx72"]
 
 
-class Enrollment(BaseModel):
-    created: datetime
-    lastUpdated: datetime
-    enrollment: str
-    trackedEntityInstance: str
-    orgUnit: str
-    storedBy: Optional[str]
-    status: str
-    completedDate: Optional[str]
-    events: List[Event] = []
-    attributes: Union[Dict[str, AttributeValue], List[AttributeValue]] = []
+class AEFIDataElementMapping(BaseModel):
+    serious: str = "fq1c1A3EOX5"
+    death: str = "DOA6ZFMro84"
+    dateOfDeath: str = "Ze34uXcBUxi"
+    lifeThreatening: str = "lATDYNmTLKD"
+    hospitalization: str = "Il1lTfknLdd"
+    disabling: str = "lsO8n8ZmLAB"
+    congenitalAnomaly: str = "lSBsxcQU0kO"
+    otherSerious: str = "tWcNgbkOETR"
+    reporterName: str = "uZ9c4fKXuNS"
+    reporterOrganization: str = "Q20pEixZxCs"
+    reporterComment: str = "IV9W7YXh939"
+    medicalHistory: str = "VXdRoWQOBxG"
+    medicalHistoryComment: str = "AfrWB2ofm7l"
+    outcome: str = "yRrSDiR5v1M"
+    reactionStartDate: str = "vNGUuAZA2C2"
+    reactionStartTime: str = "NyCB1VAOfJd"
+    otherReaction: str = "iTm5wvq16iq"  # free text reaction
 
 
-class TrackedEntity(BaseModel):
-    created: datetime
-    lastUpdated: datetime
-    trackedEntityInstance: str
-    trackedEntityType: str
-    orgUnit: str
-    storedBy: Optional[str]
-    enrollments: List[Enrollment] = []
-    attributes: Union[Dict[str, AttributeValue], List[AttributeValue]] = []
+class AEFIVaccineMapping(BaseModel):
+    name: str
+    brand: str
+    date: str
+    time: str
+    batch: str
+    dose: str
+    expiry: str
+    diluentName: str
+    diluentBatch: str
+    diluentExpiry: str
+    diluentDateOfReconstitution: str
+    diluentTimeOfReconstitution: str
 
 
-class E2BR2Source(BaseModel):
-    id: str
+class AEFIReactionMapping(BaseModel):
+    dataElement: str
+    name: str
+    typeDataElement: Optional[str]  # value is added to the name, e.g. "Seizures (febrile)"
+    qualifiers: Dict[str, str] = {}  # data element => text added to the name if the data element has a value
 
 
-class E2BR2Config(BaseModel):
-    id: str = Field(default_factory=lambda: str(uuid4()))
-    source: E2BR2Source
+class AEFIMapping(BaseModel):
+    program: str = "EZkN8vYZwjR"
+    programStage: str = "so8YZ9J3MeO"
+    attributes: AEFIAttributeMapping = AEFIAttributeMapping()
+    dataElements: AEFIDataElementMapping = AEFIDataElementMapping()
+    vaccines: List[AEFIVaccineMapping] = [
+        AEFIVaccineMapping(
+            name="uSVcZzSM3zg",
+            brand="JSd0HQOgJ8w",
+            date="dOkuCjpD978",
+            time="BSUncNBb20j",
+            batch="LNqkAlvGplL",
+            dose="LIyV4t7eCfZ",
+            expiry="VFrc8SNFYm7",
+            diluentName="xk9QvZPMVQF",
+            diluentBatch="FQM2ksIQix8",
+            diluentExpiry="cKx0VCmLrsc",
+            diluentDateOfReconstitution="om7AsREDduc",
+            diluentTimeOfReconstitution="zIKVrYHtdUx",
+        ),
+        AEFIVaccineMapping(
+            name="g9PjywVj2fs",
+            brand="eRwc8Y0CNLh",
+            date="VrzEutEnzSJ",
+            time="fZFQVZFqu0q",
+            batch="b1rSwGRcY5W",
+            dose="E3F414izniN",
+            expiry="rVUo2PBgwhr",
+            diluentName="WN8844HG0zi",
+            diluentBatch="ufWU3WStZgG",
+            diluentExpiry="FcqNLPNUPId",
+            diluentDateOfReconstitution="xXjnT9sjt4F",
+            diluentTimeOfReconstitution="KTHsZhIAGWf",
+        ),
+        AEFIVaccineMapping(
+            name="OU5klvkk3SM",
+            brand="wdZrkUvnuyr",
+            date="f4WCAVwjHz0",
+            time="VQKdZ1KeD7u",
+            batch="YBnFoNouH6f",
+            dose="WlE0K4xCc14",
+            expiry="ffYfdSPmM1W",
+            diluentName="pLu0luPWikb",
+            diluentBatch="MLP8fi1X7UX",
+            diluentExpiry="MGjnXmtmd7l",
+            diluentDateOfReconstitution="fW6RbpJk4hS",
+            diluentTimeOfReconstitution="gG0FZYpEctJ",
+        ),
+        AEFIVaccineMapping(
+            name="menOXwIFZh5",
+            brand="Ptms0lmt4QX",
+            date="H3TKHMFIN6V",
+            time="S1PRFSk8Y9v",
+            batch="BHAfwo6JPDa",
+            dose="Aya8C25DXHe",
+            expiry="ZfjyIKeX1AN",
+            diluentName="ZTyN8vSf7bc",
+            diluentBatch="MyWtDaOdlyD",
+            diluentExpiry="qhDonTAIjl0",
+            diluentDateOfReconstitution="va0Smpy0LUn",
+            diluentTimeOfReconstitution="EDdd0HsfLcO",
+        ),
+    ]
+    reactions: List[AEFIReactionMapping] = [
+        AEFIReactionMapping(
+            dataElement="UNmEidE6M9K",
+            name="Severe local reaction",
+            qualifiers={"We87rvcvd8J": ">3 days", "f8hjxmHOtAB": "Beyond nearest joint"},
+        ),
+        AEFIReactionMapping(dataElement="wCGZpudXuYx", name="Seizures", typeDataElement="Zz4KYO4AsSY"),
+        AEFIReactionMapping(dataElement="wce39JmsjIK", name="Abscess"),
+        AEFIReactionMapping(dataElement="tUmgO1Ugv6U", name="Sepsis"),
+        AEFIReactionMapping(dataElement="pdpAEuUS1W9", name="Encephalopathy"),
+        AEFIReactionMapping(dataElement="Apq4JaueuWR", name="Toxic shock syndrome"),
+        AEFIReactionMapping(dataElement="GGLLaieVChK", name="Thrombocytopenia"),
+        AEFIReactionMapping(dataElement="MkIgCrCTFyE", name="Anaphylaxis"),
+        AEFIReactionMapping(dataElement="rzhHSqK3lQq", name="Fever (> 38°C)"),
+        AEFIReactionMapping(dataElement="HY6NIt2FX4A", name="Headache"),
+        AEFIReactionMapping(dataElement="PWOzcN7UCfW", name="Irritability"),
+        AEFIReactionMapping(dataElement="seXW1hERwOo", name="Sore Throat"),
+        AEFIReactionMapping(dataElement="vCfZD893IVe", name="Joint Pain"),
+        AEFIReactionMapping(dataElement="T6tsxbKzikz", name="Abdominal Pain"),
+        AEFIReactionMapping(dataElement="ZdFB8xUhOUM", name="Cough"),
+        AEFIReactionMapping(dataElement="KOt0J61mF61", name="Nausea"),
+        AEFIReactionMapping(dataElement="NAiZTRCHRWL", name="Diarrhoea"),
+        AEFIReactionMapping(dataElement="owRcSysyioE", name="Fatigue"),
+        AEFIReactionMapping(dataElement="cMEIyp0rMo1", name="Vomiting"),
+        AEFIReactionMapping(dataElement="P4oSprWWqrn", name="Injection site soreness"),
+        AEFIReactionMapping(dataElement="KqlCtmOWt4G", name="Injection site tenderness"),
+        AEFIReactionMapping(dataElement="xgqzqv0p2Us", name="Skin rash"),
+        AEFIReactionMapping(dataElement="FC54HsGMErl", name="Itching"),
+        AEFIReactionMapping(dataElement="pzOF4lGIyTU", name="Muscle pain"),
+        AEFIReactionMapping(dataElement="GTyK3p976de", name="Persistent crying"),
+        AEFIReactionMapping(dataElement="sX1SvRadOmn", name="Poor breast feeding"),
+        AEFIReactionMapping(dataElement="QFMRugi3fm6", name="Loss of apetite"),
+        AEFIReactionMapping(dataElement="TPSvWhUfib3", name="Chills"),
+        AEFIReactionMapping(dataElement="OhHYABXmGGe", name="Fainting"),
+        AEFIReactionMapping(dataElement="nKLO8ZNdR0B", name="Mild fever"),
+        AEFIReactionMapping(dataElement="JaZ9yf1dDy3", name="Tiredness"),
+        AEFIReactionMapping(dataElement="wWDenTQ5xBR", name="Nasal congestion"),
+        AEFIReactionMapping(dataElement="GEkI9NzxTmM", name="Lymph node enlargement"),
+        AEFIReactionMapping(dataElement="XluNAFG1wj6", name="Dizziness"),
+        AEFIReactionMapping(dataElement="rjjRNU5yDhT", name="Drowsiness"),
+    ]
@@ -1,34 +1,42 @@
 import logging
-from typing import List
+import sys
+from typing import BinaryIO, Iterable, Optional
 
-from lxml.builder import E
-
-from .e2b_resources import build_messageheader, build_safetyreport, print_root
-from .models.e2b import TrackedEntity
+from .e2b_resources import build_messageheader, build_safetyreport, write_ichicsr
+from .mapping import AEFIMappingPlan
+from .models.e2b import AEFIMapping
+from .tracked_entity import IndexedTrackedEntity
 
 log = logging.getLogger(__name__)
 
 
 def run(
-    tracked_entities: List[TrackedEntity],
+    tracked_entities: Iterable[IndexedTrackedEntity],
     *,
     sender_id: str,
     receiver_id: str,
     country: str,
     receiverorganization: str,
     receivercountrycode: str,
+    output: Optional[BinaryIO] = None,
+    mapping: Optional[AEFIMapping] = None,
 ):
-    root = E.ichicsr(lang="en")
-    build_messageheader(root, sender_id, receiver_id)
+    plan = AEFIMappingPlan(mapping or AEFIMapping())
+    messageheader = build_messageheader(None, sender_id, receiver_id)
 
-    for te in tracked_entities:
-        build_safetyreport(
-            root,
-            te,
-            te.enrollments[0],
-            country,
-            receiverorganization,
-            receivercountrycode,
-        )
+    def build_safetyreports():
+        # the message is streamed, a tracked entity that can't be converted is skipped rather than
+        # leaving a truncated document without the remaining reports
+        for te in tracked_entities:
+            try:
+                yield build_safetyreport(
+                    None,
+                    plan.extract(te),
+                    country,
+                    receiverorganization,
+                    receivercountrycode,
+                )
+            except Exception as e:  # noqa
+                log.warning(f"Ignoring tracked entity '{te.trackedEntityInstance}', invalid safety report: {e!r}")
 
-    print_root(root)
+    write_ichicsr(output or sys.stdout.buffer, messageheader, build_safetyreports())
@@ -0,0 +1,67 @@
+from types import MappingProxyType
+from typing import Any, Container, Dict, Mapping, NamedTuple, Optional, Tuple
+
+# only what is needed to build safety reports, keeps payloads and parsing small for bulk exports
+TRACKED_ENTITY_FIELDS = (
+    "trackedEntityInstance,orgUnit,attributes[attribute,value],"
+    "enrollments[enrollment,orgUnit,attributes[attribute,value],"
+    "events[event,programStage,eventDate,dataValues[dataElement,value]]]"
+)
+
+
+class IndexedEvent(NamedTuple):
+    event: Optional[str]
+    programStage: str
+    eventDate: Optional[str]
+    dataValues: Mapping[str, str]  # data element => value
+
+
+class IndexedEnrollment(NamedTuple):
+    enrollment: Optional[str]
+    orgUnit: Optional[str]
+    events: Mapping[str, IndexedEvent]  # program stage => event
+
+
+class IndexedTrackedEntity(NamedTuple):
+    trackedEntityInstance: str
+    orgUnit: Optional[str]
+    attributes: Mapping[str, str]  # attribute => value, including enrollment attributes
+    enrollments: Tuple[IndexedEnrollment, ...]
+
+
+def _index_values(items, key: str, keep: Optional[Container[str]]) -> Dict[str, str]:
+    return {
+        item[key]: item.get("value") for item in items or [] if item.get(key) and (keep is None or item[key] in keep)
+    }
+
+
+def index_tracked_entity(
+    data: Dict[str, Any],
+    attributes: Optional[Container[str]] = None,
+    data_elements: Optional[Container[str]] = None,
+) -> IndexedTrackedEntity:
+    """ Read-only view of a raw tracked entity, limited to the given attributes/data elements """
+    te_attributes = _index_values(data.get("attributes"), "attribute", attributes)
+    enrollments = []
+
+    for en in data.get("enrollments") or []:
+        te_attributes.update(_index_values(en.get("attributes"), "attribute", attributes))
+
+        events: Dict[str, IndexedEvent] = {}
+
+        for ev in en.get("events") or []:
+            events[ev["programStage"]] = IndexedEvent(
+                ev.get("event"),
+                ev["programStage"],
+                ev.get("eventDate"),
+                MappingProxyType(_index_values(ev.get("dataValues"), "dataElement", data_elements)),
+            )
+
+        enrollments.append(IndexedEnrollment(en.get("enrollment"), en.get("orgUnit"), MappingProxyType(events)))
+
+    return IndexedTrackedEntity(
+        data["trackedEntityInstance"],
+        data.get("orgUnit"),
+        MappingProxyType(te_attributes),
+        tuple(enrollments),
+    )
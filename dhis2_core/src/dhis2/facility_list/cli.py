@@ -17,8 +17,11 @@ def cli_facility_list():
 @cli_facility_list.command("mcsd")
 @click.argument("config")
 @click.option("--last-updated")
+@click.option("--full", is_flag=True, help="Ignore the last successful run and fetch everything")
+@click.option("--state-dir", type=click.Path(file_okay=False), help="Directory for the sync state files")
+@click.option("--fast", is_flag=True, help="Build FHIR json directly, skipping resource validation")
 @click.pass_obj
-def cmd_openhie_mcsd(ctx, config: str, last_updated: str):
+def cmd_openhie_mcsd(ctx, config: str, last_updated: str, full: bool, state_dir: str, fast: bool):
     """ OpenHIE Mobile Care Services Discovery (mCSD) """
     mcsd_config = {
         "source": {},
@@ -38,7 +41,10 @@ def cmd_openhie_mcsd(ctx, config: str, last_updated: str):
     if last_updated:
         mcsd_config["source"]["lastUpdated"] = last_updated
 
-    mcsd.run(mcsd.MCSDConfig(**mcsd_config), ctx.inventory)
+    if fast:
+        mcsd_config["fast"] = True
+
+    mcsd.run(mcsd.MCSDConfig(**mcsd_config), ctx.inventory, state_dir=state_dir, full=full)
 
 
 def register_cli(cli):
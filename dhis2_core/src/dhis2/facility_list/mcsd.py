@@ -1,19 +1,47 @@
-import json
 import logging
 import sys
-from typing import Any, Callable, Dict, List
+from collections import Counter
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional, Tuple, Union
 
 from dhis2.core.http import BaseHttpRequest
 from dhis2.core.inventory import HostResolved, Inventory, resolve_one
-from fhir.resources.bundle import Bundle
+from dhis2.core.serializer import dump
+from dhis2.core.state import load_state, save_state
+from dhis2.core.utils import bounded_map
 
-from .mcsd_resources import build_bundle
+from .mcsd_resources import build_level_bundles
 from .models.mcsd import MCSDConfig, OrgUnit
 
 log = logging.getLogger(__name__)
 
 
-def get_source(config: MCSDConfig, inventory: Inventory) -> Callable[[Any], Any]:
+def format_last_updated(value: Union[date, datetime]) -> str:
+    if isinstance(value, datetime):
+        return value.isoformat(timespec="milliseconds")
+
+    return value.isoformat()
+
+
+def get_server_date(config: MCSDConfig, inventory: Inventory) -> str:
+    host = resolve_one(config.source.id, inventory)
+    data = BaseHttpRequest(host).get("api/system/info")
+
+    return data.get("serverDate")
+
+
+def is_updated_since(org_unit: Dict[str, Any], since: datetime) -> bool:
+    try:
+        return datetime.fromisoformat(org_unit["lastUpdated"]) >= since
+    except (KeyError, TypeError, ValueError):
+        return True  # unknown, keep it
+
+
+def get_source(
+    config: MCSDConfig,
+    inventory: Inventory,
+    since: Optional[datetime] = None,
+) -> Callable[[Any], Any]:
     host = resolve_one(config.source.id, inventory)
 
     if "dhis2" not in host.type:
@@ -26,19 +54,33 @@ def get_source(config: MCSDConfig, inventory: Inventory) -> Callable[[Any], Any]
         req = BaseHttpRequest(host)
         filter = list(map(lambda x: f"id:eq:{x}", config.source.filters))
 
+        fields = "id,code,name,level,translations,geometry,parent[id,code]"
+
         # https://docs.dhis2.org/2.35/en/developer/html/webapi_metadata_object_filter.html
         if config.source.lastUpdated:
-            filter.append(f"lastUpdated:ge:{config.source.lastUpdated}")
-
-        data = req.get(
-            "api/organisationUnits",
-            params={
-                "fields": "id,code,name,translations,geometry,parent[id,code]",
-                "rootJunction": "OR",
-                "filter": filter,
-                "paging": False,
-            },
-        )
+            filter.append(f"lastUpdated:ge:{format_last_updated(config.source.lastUpdated)}")
+
+        # the filters are ORed (rootJunction), so with id filters the changes since the last run are
+        # selected here instead of by the server
+        if since and config.source.filters:
+            fields += ",lastUpdated"
+        elif since:
+            filter.append(f"lastUpdated:ge:{format_last_updated(since)}")
+
+        params = {
+            "fields": fields,
+            "rootJunction": "OR",
+            "filter": filter,
+            "order": "level:asc,id:asc",  # parents before children
+        }
+
+        if config.source.pageSize:
+            data = req.get_paged("api/organisationUnits", "organisationUnits", params, page_size=config.source.pageSize)
+        else:
+            data = req.get_stream("api/organisationUnits", "organisationUnits", {**params, "paging": False})
+
+        if since and config.source.filters:
+            data = (org_unit for org_unit in data if is_updated_since(org_unit, since))
 
         return (
             host,
@@ -57,7 +99,11 @@ def get_target(config: MCSDConfig, inventory: Inventory) -> Callable[[Any], Any]
 
         def target_log(data: Any):
             log.info("Writing result to stdout")
-            print(json.dumps(data[1].as_json(), indent=2))
+
+            for _, bundles in data[1]:
+                for bundle in bundles:
+                    dump(bundle, sys.stdout, indent=2)
+                    sys.stdout.write("\n")
 
         return target_log
     elif "null://" == id:
@@ -67,6 +113,10 @@ def get_target(config: MCSDConfig, inventory: Inventory) -> Callable[[Any], Any]
         def target_null(data: Any):
             log.info("Doing nothing with result")
 
+            for _, bundles in data[1]:  # still build the bundles
+                for _ in bundles:
+                    pass
+
         return target_null
 
     host = resolve_one(id, inventory)
@@ -77,32 +127,72 @@ def get_target(config: MCSDConfig, inventory: Inventory) -> Callable[[Any], Any]
 
     log.info(f"Creating target from '{host.key}' with base url '{host.baseUrl}'")
 
-    def target_push(data: Any):
-        payload: Bundle = data[1]
-        return BaseHttpRequest(host).post("", data=payload.as_json())
+    def push(item: Tuple[int, Dict[str, Any]]):
+        idx, bundle = item
+        response = BaseHttpRequest(host).post("", data=bundle)
+
+        statuses = Counter(entry.get("response", {}).get("status") for entry in response.get("entry", []))
+        log.info(f"Pushed bundle {idx} with {len(bundle['entry'])} entries, got response statuses {dict(statuses)}")
+
+        return response
+
+    def target_push(data: Any) -> int:
+        count = 0
+
+        # partOf must point to an existing location, a level is committed before the next is pushed
+        for level, bundles in data[1]:
+            non_empty: Iterable[Dict[str, Any]] = (bundle for bundle in bundles if bundle.get("entry"))
+
+            for _ in bounded_map(push, enumerate(non_empty, count + 1), config.target.parallel):
+                count += 1
+
+            if level is not None:
+                log.info(f"Pushed organisation units of level {level}")
+
+        return count
 
     return target_push
 
 
 def transform(config: MCSDConfig, data: Any):
     host: HostResolved = data[0]
-    payload: Dict[str, Any] = data[1]
+    payload: Iterable[Dict[str, Any]] = data[1]
 
-    org_units: List[OrgUnit] = []
-
-    for org_unit in payload.get("organisationUnits", []):
-        org_units.append(OrgUnit(**org_unit))
+    org_units: Iterator[OrgUnit] = (OrgUnit(**org_unit) for org_unit in payload)
 
     return (
         host,
-        build_bundle(org_units, host.baseUrl),
+        build_level_bundles(
+            org_units,
+            host.baseUrl,
+            bundle_size=config.target.bundleSize,
+            fast=config.fast,
+            validate_sample=config.validateSample,
+        ),
     )
 
 
-def run(config: MCSDConfig, inventory: Inventory):
+def run(config: MCSDConfig, inventory: Inventory, state_dir: Optional[str] = None, full: bool = False):
     log.info(f"mCSD job '{config.id}'' starting")
 
-    source = get_source(config, inventory)
+    # sync state is only kept for jobs with a stable id, the default id is random for every run, and
+    # only updated after pushing to a real target
+    incremental = "id" in config.__fields_set__
+    persist = incremental and config.target.id not in ["log://", "null://"]
+    server_date = None
+    since = None
+
+    if incremental:
+        state = load_state("mcsd", config.id, state_dir)
+
+        if not full and not config.source.lastUpdated and state.get("serverDate"):
+            log.info(f"Fetching organisation units updated since last run at '{state['serverDate']}'")
+            since = datetime.fromisoformat(state["serverDate"])
+
+    if persist:
+        server_date = get_server_date(config, inventory)
+
+    source = get_source(config, inventory, since)
     target = get_target(config, inventory)
 
     data = source()
@@ -110,6 +200,9 @@ def run(config: MCSDConfig, inventory: Inventory):
     data = target(data)
 
     if data:
-        log.info(f"Got response from target system {data}")
+        log.info(f"Got {data} responses from target system")
+
+    if persist and server_date:
+        save_state("mcsd", config.id, {"serverDate": server_date}, state_dir)
 
     log.info(f"mCSD job '{config.id}' finished")
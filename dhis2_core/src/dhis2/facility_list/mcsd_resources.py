@@ -1,6 +1,12 @@
+import json
 import logging
+import random
+import sys
 from base64 import b64encode
-from typing import List
+from itertools import groupby
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dhis2.core.utils import chunked, compact
 
 from fhir.resources.attachment import Attachment
 from fhir.resources.bundle import Bundle, BundleEntry, BundleEntryRequest
@@ -150,15 +156,208 @@ def build_organization_bundle_entry(org_unit: OrgUnit, base_url: str) -> BundleE
     return entry
 
 
-def build_bundle(org_units: List[OrgUnit], base_url: str) -> Bundle:
+def build_bundle(org_units: Iterable[OrgUnit], base_url: str) -> Bundle:
     bundle = Bundle()
     bundle.type = "transaction"
     bundle.entry = []
 
-    log.info(f"Building FHIR bundle from '{len(org_units)}' organisation units")
+    log.info("Building FHIR bundle from DHIS2 organisation units")
 
     for org_unit in org_units:
         bundle.entry.append(build_location_bundle_entry(org_unit, base_url))
         bundle.entry.append(build_organization_bundle_entry(org_unit, base_url))
 
+    log.info(f"Built FHIR bundle from '{len(bundle.entry) // 2}' organisation units")
+
     return bundle
+
+
+# the *_json builders below produce the same json as `.as_json()` of the resources built above,
+# but without creating (and validating) fhir.resources models, keys are in fhir.resources order
+
+
+def build_mcsd_location_json(org_unit: OrgUnit, base_url: str) -> Dict[str, Any]:
+    resource = {
+        "id": org_unit.id,
+        "meta": {
+            "profile": [
+                "http://ihe.net/fhir/StructureDefinition/IHE_mCSD_Location",
+            ],
+        },
+    }
+
+    position = None
+
+    if org_unit.geometry:
+        geometry = org_unit.geometry
+        geometry_str = geometry.json().encode("utf-8")
+
+        if "Point" == geometry.type:
+            coordinates = geometry.coordinates
+            position = compact({"latitude": coordinates[1], "longitude": coordinates[0]})
+
+        resource["extension"] = [
+            {
+                "url": "http://hl7.org/fhir/StructureDefinition/location-boundary-geojson",
+                "valueAttachment": {
+                    "contentType": "application/geo+json",
+                    "data": str(b64encode(geometry_str), "utf-8"),
+                },
+            }
+        ]
+
+    resource["description"] = org_unit.name
+    resource["identifier"] = build_identifiers_json(org_unit, base_url)
+    resource["managingOrganization"] = {"reference": f"Organization/{org_unit.id}"}
+    resource["mode"] = "instance"
+    resource["name"] = org_unit.name
+
+    if org_unit.parent:
+        resource["partOf"] = {"reference": f"Location/{org_unit.parent.id}"}
+
+    resource["physicalType"] = {
+        "coding": [
+            {
+                "code": "si",
+                "system": "http://terminology.hl7.org/CodeSystem/location-physical-type",
+            }
+        ]
+    }
+
+    resource["position"] = position or None
+    resource["status"] = "active"
+    resource["type"] = [{"text": "OF"}]
+    resource["resourceType"] = "Location"
+
+    return compact(resource)
+
+
+def build_mcsd_organization_json(org_unit: OrgUnit, base_url: str) -> Dict[str, Any]:
+    resource = {
+        "id": org_unit.id,
+        "meta": {
+            "profile": [
+                "http://ihe.net/fhir/StructureDefinition/IHE_mCSD_Organization",
+            ],
+        },
+        "identifier": build_identifiers_json(org_unit, base_url),
+        "name": org_unit.name,
+        "type": [
+            {
+                "coding": [
+                    {
+                        "code": "prov",
+                        "system": "http://terminology.hl7.org/CodeSystem/organization-type",
+                    }
+                ]
+            }
+        ],
+        "resourceType": "Organization",
+    }
+
+    if is_facility(org_unit):
+        resource["meta"]["profile"].append("http://ihe.net/fhir/StructureDefinition/IHE_mCSD_FacilityOrganization")
+        resource["type"].append(
+            {
+                "coding": [
+                    {
+                        "code": "urn:ihe:iti:mcsd:2019:facility",
+                        "system": "urn:ietf:rfc:3986",
+                    }
+                ]
+            }
+        )
+
+    return compact(resource)
+
+
+def build_identifiers_json(org_unit: OrgUnit, base_url: str) -> List[Dict[str, Any]]:
+    identifiers = [{"system": f"{base_url}/api/organisationUnits", "value": org_unit.id}]
+
+    if org_unit.code:
+        identifiers.append({"system": f"{base_url}/api/organisationUnits", "value": org_unit.code})
+
+    return identifiers
+
+
+def build_bundle_entries_json(org_unit: OrgUnit, base_url: str) -> List[Dict[str, Any]]:
+    return [
+        {
+            "request": {"method": "PUT", "url": f"Location?identifier={org_unit.id}"},
+            "resource": build_mcsd_location_json(org_unit, base_url),
+        },
+        {
+            "request": {"method": "PUT", "url": f"Organization?identifier={org_unit.id}"},
+            "resource": build_mcsd_organization_json(org_unit, base_url),
+        },
+    ]
+
+
+def validate_bundle_entries_json(org_unit: OrgUnit, base_url: str, entries: List[Dict[str, Any]]):
+    expected = [
+        build_location_bundle_entry(org_unit, base_url).as_json(),
+        build_organization_bundle_entry(org_unit, base_url).as_json(),
+    ]
+
+    if json.dumps(expected) != json.dumps(entries):
+        log.error(f"Fast and validated FHIR resources differ for organisation unit '{org_unit.id}'")
+        sys.exit(-1)
+
+
+def build_bundle_json(org_units: Iterable[OrgUnit], base_url: str, validate_sample: float = 0.0) -> Dict[str, Any]:
+    entry = []
+
+    log.info("Building FHIR bundle from DHIS2 organisation units")
+
+    for org_unit in org_units:
+        entries = build_bundle_entries_json(org_unit, base_url)
+
+        if validate_sample and random.random() < validate_sample:
+            validate_bundle_entries_json(org_unit, base_url, entries)
+
+        entry.extend(entries)
+
+    log.info(f"Built FHIR bundle from '{len(entry) // 2}' organisation units")
+
+    return compact({"entry": entry or None, "type": "transaction", "resourceType": "Bundle"})
+
+
+def build_bundles(
+    org_units: Iterable[OrgUnit],
+    base_url: str,
+    bundle_size: Optional[int] = None,
+    fast: bool = False,
+    validate_sample: float = 0.0,
+) -> Iterator[Dict[str, Any]]:
+    def build(org_units: Iterable[OrgUnit]) -> Dict[str, Any]:
+        if fast:
+            return build_bundle_json(org_units, base_url, validate_sample)
+
+        return build_bundle(org_units, base_url).as_json()
+
+    if not bundle_size:
+        yield build(org_units)
+        return
+
+    # every organisation unit is added as both a location and an organization entry
+    for chunk in chunked(org_units, bundle_size // 2):
+        yield build(chunk)
+
+
+def build_level_bundles(
+    org_units: Iterable[OrgUnit],
+    base_url: str,
+    bundle_size: Optional[int] = None,
+    fast: bool = False,
+    validate_sample: float = 0.0,
+) -> Iterator[Tuple[Optional[int], Iterator[Dict[str, Any]]]]:
+    """
+    Like build_bundles, but a bundle never mixes levels and the bundles are grouped per level. The
+    organisation units must be ordered by level, so parents are pushed before their children.
+    """
+    if not bundle_size:
+        yield None, build_bundles(org_units, base_url, None, fast, validate_sample)  # a single transaction
+        return
+
+    for level, group in groupby(org_units, key=lambda org_unit: org_unit.level):
+        yield level, build_bundles(group, base_url, bundle_size, fast, validate_sample)
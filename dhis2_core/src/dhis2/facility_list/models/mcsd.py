@@ -1,5 +1,5 @@
-from datetime import date
-from typing import Any, List, Optional
+from datetime import date, datetime
+from typing import Any, List, Optional, Union
 from uuid import uuid4
 
 from dhis2.core.metadata.models import Translation
@@ -8,7 +8,7 @@ from pydantic import BaseModel, Field
 
 class BaseSource(BaseModel):
     id: str
-    lastUpdated: Optional[date]
+    lastUpdated: Optional[Union[datetime, date]]
 
 
 class BaseTarget(BaseModel):
@@ -17,14 +17,18 @@ class BaseTarget(BaseModel):
 
 class MCSDSource(BaseSource):
     filters: List[str] = []
+    pageSize: int = Field(1000, ge=0)  # 0 disables paging, the response is decoded while downloading
 
 
 class MCSDTarget(BaseTarget):
-    pass
+    bundleSize: Optional[int] = Field(None, gt=1)  # max number of entries per bundle, unbounded if not set
+    parallel: int = Field(1, gt=0)  # number of bundles pushed in parallel
 
 
 class MCSDConfig(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid4()))
+    fast: bool = False  # build FHIR json directly instead of through fhir.resources
+    validateSample: float = Field(0.0, ge=0.0, le=1.0)  # fraction of fast built resources to validate
     source: MCSDSource
     target: MCSDTarget
 
@@ -42,5 +46,6 @@ class OrgUnitGeometry(BaseModel):
 
 
 class OrgUnit(BaseEntity):
+    level: Optional[int]
     geometry: Optional[OrgUnitGeometry]
     parent: Optional[BaseEntity]
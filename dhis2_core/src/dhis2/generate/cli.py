@@ -1,15 +1,23 @@
 import json
 import logging
+import re
+from typing import Any, Dict, Optional, Tuple
 
 import click
-from dhis2.core.inventory import resolve_one
-from dhis2.core.utils import load_and_parse_schema
+from dhis2.core.cache import ResponseCache
+from dhis2.core.http import BaseHttpRequest
+from dhis2.core.inventory import HostResolved, resolve
+from dhis2.core.utils import bounded_map, load_schema_payload
 
-from .json_schema import generate_json_schema_metadata
+from .json_schema import diff_json_schema_metadata, generate_json_schema_metadata, generate_json_schema_metadata_many
 
 log = logging.getLogger(__name__)
 
 
+def version_key(version: Optional[str]) -> Tuple[int, ...]:
+    return tuple(int(part) for part in re.findall(r"\d+", version or ""))
+
+
 @click.group("generate")
 def cli_generator():
     """ Various commands for generating data/schemas """
@@ -18,14 +26,79 @@ def cli_generator():
 
 @cli_generator.command("json_schemas")
 @click.argument("host-id")
+@click.option("--cache-dir", type=click.Path(file_okay=False), help="Cache directory")
+@click.option("--no-cache", is_flag=True, help="Always download and generate all schemas")
+@click.option("--concurrency", default=8, type=click.IntRange(min=1), help="Number of hosts fetched in parallel")
+@click.option("--processes", type=click.IntRange(min=1), help="Number of processes generating schemas")
+@click.option("--diff", is_flag=True, help="Print the differences between host versions instead of the schemas")
 @click.pass_obj
-def cmd_json_schemas(ctx, host_id: str):
-    """ Generate JSON Schemas from a dhis2 instance """
-    host = resolve_one(host_id, ctx.inventory)
-    schemas = load_and_parse_schema(host)
+def cmd_json_schemas(
+    ctx,
+    host_id: str,
+    cache_dir: str,
+    no_cache: bool,
+    concurrency: int,
+    processes: int,
+    diff: bool,
+):
+    """ Generate JSON Schemas from a dhis2 instance, or all instances of a group """
+    hosts = resolve(host_id, ctx.inventory)
+    cache = None if no_cache else ResponseCache(cache_dir)
+
+    if 1 == len(hosts) and not diff:
+        data = load_schema_payload(hosts[0], cache)
+
+        if data and data.get("schemas"):
+            click.echo(json.dumps(generate_json_schema_metadata(data["schemas"], cache), indent=2))
+
+        return
+
+    def fetch(host: HostResolved) -> Tuple[HostResolved, Dict[str, Any], Optional[Dict[str, Any]]]:
+        info = BaseHttpRequest(host).get("api/system/info") or {}
+        return host, info, load_schema_payload(host, cache, info)
+
+    dhis2_hosts = []
+
+    for host in hosts:
+        if "dhis2" != host.type:
+            log.warning(f"Only 'dhis2' type is supported, ignoring host '{host.key}' with type '{host.type}'")
+            continue
+
+        dhis2_hosts.append(host)
+
+    results = []
+
+    for host, info, data in bounded_map(fetch, dhis2_hosts, concurrency):
+        if not data or not data.get("schemas"):
+            log.warning(f"No schemas found for host '{host.key}', ignoring")
+            continue
+
+        results.append((host, info.get("version"), data["schemas"]))
+
+    results.sort(key=lambda result: version_key(result[1]))
+
+    schemas = generate_json_schema_metadata_many(
+        [payload for _, _, payload in results],
+        cache_dir=str(cache.path) if cache else None,
+        processes=processes,
+    )
+
+    if not diff:
+        click.echo(json.dumps({host.key: schema for (host, _, _), schema in zip(results, schemas)}, indent=2))
+        return
+
+    diffs = []
+
+    for (old, new), (old_schema, new_schema) in zip(zip(results, results[1:]), zip(schemas, schemas[1:])):
+        diffs.append(
+            {
+                "from": {"host": old[0].key, "version": old[1]},
+                "to": {"host": new[0].key, "version": new[1]},
+                **diff_json_schema_metadata(old_schema, new_schema),
+            }
+        )
 
-    if schemas:
-        click.echo(json.dumps(generate_json_schema_metadata(schemas), indent=2))
+    click.echo(json.dumps(diffs, indent=2))
 
 
 def register_cli(cli):
@@ -1,11 +1,17 @@
+import hashlib
+import json
 import logging
 import sys
-from typing import Any, Dict, List
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Union
 
+from dhis2.core.cache import ResponseCache
 from dhis2.core.metadata.models import Property, Schema
 
 log = logging.getLogger(__name__)
 
+DEFINITION_VERSION = 1  # bump when the generated definitions change, invalidates cached definitions
+
 
 def handle_reference(dhis2_property: Property, property: Dict[str, Any]):
     if dhis2_property.identifiableObject and not dhis2_property.embeddedObject:
@@ -113,7 +119,21 @@ def generate_json_schema(dhis2_schema: Schema):
     return schema
 
 
-def generate_json_schema_metadata(dhis2_schemas: List[Schema]):
+def generate_definition(dhis2_schema: Dict[str, Any], cache: Optional[ResponseCache] = None) -> Dict[str, Any]:
+    if cache is None:
+        return handle_object(Schema(**dhis2_schema))
+
+    # definitions only depend on the schema content, unchanged schemas are shared between versions
+    digest = hashlib.sha256(json.dumps(dhis2_schema, sort_keys=True).encode("utf-8")).hexdigest()
+    key = cache.key("json-schema-definition", DEFINITION_VERSION, dhis2_schema.get("klass"), digest)
+
+    return cache.fetch(key, lambda: handle_object(Schema(**dhis2_schema)))
+
+
+def generate_json_schema_metadata(
+    dhis2_schemas: List[Union[Schema, Dict[str, Any]]],
+    cache: Optional[ResponseCache] = None,
+):
     schema = {
         "$id": "https://dhis2.org/schemas/metadata",
         "$schema": "http://json-schema.org/draft-07/schema#",
@@ -130,18 +150,76 @@ def generate_json_schema_metadata(dhis2_schemas: List[Schema]):
         "required": [],
     }
 
-    for dhis2_schema in dhis2_schemas:
+    # raw schemas are only fully parsed when their definition is not cached
+    raw_schemas = [s.dict() if isinstance(s, Schema) else s for s in dhis2_schemas]
+    headers = [Schema.construct(**s) for s in raw_schemas]
+
+    for dhis2_schema in headers:
         if not dhis2_schema.metadata:
             continue
 
         property = {"type": "array", "items": {"$ref": f"#/definitions/{dhis2_schema.name}"}}
         schema.get("properties")[dhis2_schema.plural] = property
 
-    for dhis2_schema in dhis2_schemas:
+    for dhis2_schema, raw_schema in zip(headers, raw_schemas):
         if not dhis2_schema.metadata and not dhis2_schema.embeddedObject:
             continue
 
-        property = handle_object(dhis2_schema)
+        property = generate_definition(raw_schema, cache)
         schema.get("definitions")[dhis2_schema.singular] = property
 
     return schema
+
+
+def _generate_json_schema_metadata_worker(dhis2_schemas: List[Dict[str, Any]], cache_dir: Optional[str]):
+    # runs in a worker process, the cache is re-opened from its path instead of being pickled
+    cache = ResponseCache(cache_dir) if cache_dir else None
+    return generate_json_schema_metadata(dhis2_schemas, cache)
+
+
+def generate_json_schema_metadata_many(
+    payloads: List[List[Dict[str, Any]]],
+    cache_dir: Optional[str] = None,
+    processes: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    if len(payloads) < 2:
+        return [_generate_json_schema_metadata_worker(payload, cache_dir) for payload in payloads]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        return list(executor.map(_generate_json_schema_metadata_worker, payloads, [cache_dir] * len(payloads)))
+
+
+def _diff_keys(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, List[str]]:
+    return {
+        "added": sorted(new.keys() - old.keys()),
+        "removed": sorted(old.keys() - new.keys()),
+        "changed": sorted(key for key in old.keys() & new.keys() if old[key] != new[key]),
+    }
+
+
+def diff_json_schema_metadata(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    definitions = _diff_keys(old.get("definitions", {}), new.get("definitions", {}))
+    changed = {}
+
+    for name in definitions["changed"]:
+        old_definition = old["definitions"][name]
+        new_definition = new["definitions"][name]
+        old_required = set(old_definition.get("required", []))
+        new_required = set(new_definition.get("required", []))
+
+        changed[name] = {
+            "properties": _diff_keys(old_definition.get("properties", {}), new_definition.get("properties", {})),
+            "required": {
+                "added": sorted(new_required - old_required),
+                "removed": sorted(old_required - new_required),
+            },
+        }
+
+    return {
+        "properties": _diff_keys(old.get("properties", {}), new.get("properties", {})),
+        "definitions": {
+            "added": definitions["added"],
+            "removed": definitions["removed"],
+            "changed": changed,
+        },
+    }